@@ -0,0 +1,371 @@
+import argparse
+import io
+import json
+import platform
+import sys
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import date
+from os import path, makedirs, chdir, getcwd
+from shutil import rmtree
+from time import perf_counter
+from typing import Any, Callable
+
+import document_services as ds
+
+LICENSE_HEADER = """<?php
+// This file is part of local_lbplanner.
+//
+// Moodle is free software: you can redistribute it and/or modify
+// it under the terms of the GNU General Public License as published by
+// the Free Software Foundation, either version 3 of the License, or
+// (at your option) any later version.
+//
+// Moodle is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+// GNU General Public License for more details.
+//
+// You should have received a copy of the GNU General Public License
+// along with Moodle.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+def alpha(n: int) -> str:
+    """Encodes a number using only lowercase letters, since services.php names may not contain digits.
+
+    0 → "a", 25 → "z", 26 → "ba", …
+    """
+    out = []
+    while True:
+        out.append(chr(ord('a') + n % 26))
+        n //= 26
+        if n == 0:
+            return "".join(reversed(out))
+
+def write_file(fp: str, content: str):
+    makedirs(path.dirname(fp), exist_ok=True)
+    with open(fp, "w") as f:
+        f.write(content)
+
+def generate_enum(k: int, parent: str) -> str:
+    cases = "\n".join(f"    const CASE_{alpha(k)}_{alpha(i).upper()} = {k * 10 + i};" for i in range(4))
+    return f"""{LICENSE_HEADER}
+namespace local_lbplanner\\enums;
+
+use local_lbplanner\\polyfill\\Enum;
+
+/**
+ * synthetic enum number {k}
+ */
+class ENUM_{alpha(k).upper()} extends {parent} {{
+{cases}
+}}
+"""
+
+def generate_model(k: int, enumcount: int, fields: int, depth: int) -> str:
+    enum = f"ENUM_{alpha(k % enumcount).upper()}"
+    lines = [f"                'id' => new external_value(PARAM_INT, 'ID of model {k}'),"]
+    for i in range(fields):
+        match i % 4:
+            case 0:
+                lines.append(f"                'value_{alpha(i)}' => new external_value(PARAM_INT, 'value {i} ' . {enum}::format()),")
+            case 1:
+                lines.append(f"                'text_{alpha(i)}' => new external_value(PARAM_TEXT, 'text {i}', VALUE_DEFAULT, null, NULL_ALLOWED),")
+            case 2:
+                lines.append(f"                'flag_{alpha(i)}' => new external_value(PARAM_BOOL, 'flag {i}', VALUE_DEFAULT, false),")
+            case 3:
+                lines.append(f"                'url_{alpha(i)}' => new external_value(PARAM_URL, 'url {i}'),")
+    if k % depth != 0:
+        lines.append(f"                'children' => new external_multiple_structure(model_{alpha(k - 1)}::api_structure()),")
+    body = "\n".join(lines)
+
+    return f"""{LICENSE_HEADER}
+namespace local_lbplanner\\model;
+
+use core_external\\{{external_multiple_structure, external_single_structure, external_value}};
+use local_lbplanner\\enums\\{enum};
+
+/**
+ * synthetic model number {k}
+ */
+class model_{alpha(k)} {{
+    /**
+     * Returns the api structure of this model.
+     * @return external_single_structure
+     */
+    public static function api_structure(): external_single_structure {{
+        return new external_single_structure(
+            [
+{body}
+            ]
+        );
+    }}
+}}
+"""
+
+def generate_service(group: str, name: str, description: str, model: str, year: int) -> str:
+    return f"""{LICENSE_HEADER}
+namespace local_lbplanner_services;
+
+use core_external\\{{external_api, external_function_parameters, external_multiple_structure, external_value}};
+use local_lbplanner\\model\\{model};
+
+/**
+ * {description}.
+ *
+ * @package local_lbplanner
+ * @subpackage services_{group}
+ * @copyright {year} Pallasys
+ * @license https://creativecommons.org/licenses/by-nc-sa/4.0/ CC-BY-NC-SA 4.0 International or later
+ */
+class {group}_{name} extends external_api {{
+    /**
+     * Parameters for {name}.
+     * @return external_function_parameters
+     */
+    public static function {name}_parameters(): external_function_parameters {{
+        global $USER;
+        return new external_function_parameters([
+            'id' => new external_value(PARAM_INT, 'the id', VALUE_REQUIRED, null, NULL_NOT_ALLOWED),
+            'name' => new external_value(PARAM_TEXT, 'the name', VALUE_DEFAULT, null, NULL_ALLOWED),
+            'userid' => new external_value(PARAM_INT, 'the user', VALUE_DEFAULT, $USER->id, NULL_NOT_ALLOWED),
+        ]);
+    }}
+
+    /**
+     * {description}.
+     *
+     * @param int $id the id
+     * @param ?string $name the name
+     * @param int $userid the user
+     */
+    public static function {name}(int $id, ?string $name, int $userid): array {{
+        global $DB;
+        self::validate_parameters(
+            self::{name}_parameters(),
+            ['id' => $id, 'name' => $name, 'userid' => $userid]
+        );
+
+        $results = [];
+        foreach ($DB->get_records('local_lbplanner_things', ['userid' => $userid]) as $record) {{
+            $results[] = $DB->get_record('local_lbplanner_other', ['id' => $record->id]);
+        }}
+        return $results;
+    }}
+
+    /**
+     * Returns the structure of the result.
+     * @return external_multiple_structure
+     */
+    public static function {name}_returns(): external_multiple_structure {{
+        return new external_multiple_structure(
+            {model}::api_structure()
+        );
+    }}
+}}
+"""
+
+def generate_tree(root: str, services: int, fields: int = 12, depth: int = 4, groupsize: int = 20):
+    """Writes a synthetic lbplanner/ plugin tree that document_services.py processes without warnings.
+
+    :param str root: The directory to create the lbplanner/ folder in.
+    :param int services: The amount of services to generate.
+    :param int fields: The amount of fields per model structure.
+    :param int depth: The maximum nesting depth of model structures.
+    :param int groupsize: The amount of services per service group.
+    """
+    plugin = path.join(root, "lbplanner")
+    year = date.today().year
+
+    enumcount = max(2, services // 50)
+    for k in range(enumcount):
+        # every third enum extends the previous one, to exercise inheritance chains
+        parent = f"ENUM_{alpha(k - 1).upper()}" if k % 3 == 2 else "Enum"
+        write_file(path.join(plugin, "classes", "enums", f"ENUM_{alpha(k).upper()}.php"), generate_enum(k, parent))
+
+    modelcount = max(1, services // 10)
+    for k in range(modelcount):
+        write_file(path.join(plugin, "classes", "model", f"model_{alpha(k)}.php"), generate_model(k, enumcount, fields, depth))
+
+    function_entries = []
+    service_names = []
+    for i in range(services):
+        group = f"grp{alpha(i // groupsize)}"
+        name = f"svc_{alpha(i)}"
+        description = f"Synthetic service {alpha(i)} of group {group}"
+        fullname = f"local_lbplanner_{group}_{name}"
+        write_file(
+            path.join(plugin, "services", group, f"{name}.php"),
+            generate_service(group, name, description, f"model_{alpha(i % modelcount)}", year),
+        )
+        function_entries.append(f"""    '{fullname}' => [
+        'classname' => 'local_lbplanner_services\\{group}_{name}',
+        'methodname' => '{name}',
+        'classpath' => 'local/lbplanner/services/{group}/{name}.php',
+        'description' => '{description}',
+        'type' => '{"read" if i % 2 == 0 else "write"}',
+        'capabilities' => 'local/lb_planner:student',
+        'ajax' => true,
+    ],""")
+        service_names.append(f"            '{fullname}',")
+
+    functions = "\n".join(function_entries)
+    names = "\n".join(service_names)
+    write_file(path.join(plugin, "db", "services.php"), f"""{LICENSE_HEADER}
+/**
+ * contains all service endpoints
+ *
+ * @package local_lbplanner
+ * @subpackage db
+ * @copyright {year} Pallasys
+ * @license https://creativecommons.org/licenses/by-nc-sa/4.0/ CC-BY-NC-SA 4.0 International or later
+ */
+
+defined('MOODLE_INTERNAL') || die();
+
+$functions = [
+{functions}
+];
+
+$services = [
+    'LB Planer API' => [
+        'functions' => [
+{names}
+        ],
+        'restrictedusers' => 0,
+        'enabled' => 1,
+        'shortname' => 'lb_planner_api',
+    ],
+];
+""")
+
+def timed(func: Callable[[], Any], repeat: int) -> float:
+    """Returns the fastest of several runs of a function, in seconds. Caches are reset before every run."""
+    best = float('inf')
+    for _ in range(repeat):
+        ds.reset_state()
+        start = perf_counter()
+        func()
+        best = min(best, perf_counter() - start)
+    return best
+
+def benchmark_tree(services: int, repeat: int) -> dict[str, float]:
+    """Times the phases of document_services.py on the tree in the working directory.
+
+    :returns: The fastest time of each phase, in seconds.
+    """
+    content = ds.SOURCES.read("lbplanner/db/services.php")
+    infos = ds.extract_function_info(content)
+    assert len(infos) == services, f"expected {services} services, found {len(infos)}"
+    sources = [(info, ds.SOURCES.read(info.path)) for info in infos]
+
+    def extract_all():
+        for info, code in sources:
+            ds.extract_api_functions(code, info.path)
+
+    extracted = []
+    for info, code in sources:
+        params_func, _, returns_func = ds.extract_api_functions(code, info.path)
+        assert params_func is not None and returns_func is not None
+        extracted.append((ds.extract_imports(code), params_func.body, returns_func.body))
+
+    def parse_all():
+        for imports, params_body, returns_body in extracted:
+            ds.parse_function(params_body, imports)
+            ds.parse_function(returns_body, imports)
+
+    def run_main():
+        argv = sys.argv
+        sys.argv = ["document_services.py", "/dev/null"]
+        try:
+            ds.main()
+        except SystemExit:
+            pass
+        finally:
+            sys.argv = argv
+
+    return {
+        "extract_function_info": timed(lambda: ds.extract_function_info(content), repeat),
+        "extract_api_functions": timed(extract_all, repeat),
+        "parse_function": timed(parse_all, repeat),
+        "main": timed(run_main, repeat),
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks document_services.py on synthetic plugin trees.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="amounts of services to generate")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per phase; the fastest one counts (default: %(default)s)")
+    parser.add_argument("--out", default="-", help="file to write the JSON results to, or '-' for stdout")
+    parser.add_argument("--keep", metavar="DIR", help="generate the trees in this directory and keep them")
+    parser.add_argument(
+        "--max-scaling",
+        type=float,
+        help="exit with an error if the time per service of any phase grows by more than this factor between two sizes",
+    )
+    args = parser.parse_args()
+
+    sizes = sorted(args.sizes)
+    workdir = args.keep if args.keep is not None else tempfile.mkdtemp(prefix="lbplanner_bench_")
+    cwd = getcwd()
+
+    runs = []
+    try:
+        for size in sizes:
+            root = path.join(workdir, f"n{size}")
+            if path.exists(root):
+                rmtree(root)
+            generate_tree(root, size)
+
+            chdir(root)
+            try:
+                with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+                    timings = benchmark_tree(size, args.repeat)
+            finally:
+                chdir(cwd)
+
+            runs.append({"services": size, "seconds": timings})
+            print(f"n={size}: " + ", ".join(f"{phase} {secs * 1000:.1f}ms" for phase, secs in timings.items()), file=sys.stderr)
+    finally:
+        ds.reset_state()
+        if args.keep is None:
+            rmtree(workdir)
+
+    # time per service of each phase, relative to the previous size; ~1.0 means linear scaling
+    scaling = []
+    for prev, cur in zip(runs, runs[1:]):
+        factors = {}
+        for phase, secs in cur["seconds"].items():
+            prev_per_service = prev["seconds"][phase] / prev["services"]
+            cur_per_service = secs / cur["services"]
+            factors[phase] = cur_per_service / prev_per_service if prev_per_service > 0 else None
+        scaling.append({"from": prev["services"], "to": cur["services"], "factors": factors})
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "runs": runs,
+        "scaling": scaling,
+    }
+
+    data = json.dumps(report, indent=4)
+    if args.out == "-":
+        print(data)
+    else:
+        with open(args.out, "w") as f:
+            f.write(data + "\n")
+
+    if args.max_scaling is not None:
+        regressions = [
+            f"{phase}: {factor:.2f}x per service from n={step['from']} to n={step['to']}"
+            for step in scaling
+            for phase, factor in step["factors"].items()
+            if factor is not None and factor > args.max_scaling
+        ]
+        if len(regressions) > 0:
+            print("superlinear scaling detected:", *regressions, sep="\n    ", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,605 @@
+import argparse
+import cProfile
+import hashlib
 import json
+import pickle
+import pstats
 import re
 import sys
-from os import path, listdir
+import tracemalloc
+import xml.etree.ElementTree as ET
+from os import path, listdir, scandir, stat, makedirs, replace, walk
 from abc import ABC, abstractmethod
 import traceback as tb
-from subprocess import Popen, PIPE
+from subprocess import Popen, PIPE, DEVNULL
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from datetime import date
+from json.encoder import encode_basestring_ascii as encode_json_string
+from time import perf_counter, sleep
+from types import MappingProxyType
+from weakref import WeakValueDictionary
 
-from typing import Any, Iterable
+from typing import Any, Callable, Iterable, TypeVar
+
+T = TypeVar('T')
 
-WARNCOUNT: dict[str, int] = {}
 CURRENT_SERVICE: str | None = None
+CURRENT_FILE: str | None = None
+CURRENT_LINE: int | None = None
+
+class Diagnostic:
+    """A single finding, e.g. an inconsistency in a service's documentation."""
+    __slots__ = ('code', 'severity', 'message', 'service', 'file', 'line', 'context', 'stack')
+    code: str
+    severity: str
+    message: str
+    service: str | None
+    file: str | None
+    line: int | None
+    context: tuple[str, ...]
+    stack: tuple[str, ...] | None
 
-def warn(msg: str, *context: Any):
-    """Prints a warning message to the console and increments the global WARNCOUNT variable.
+    def __init__(
+        self,
+        code: str,
+        severity: str,
+        message: str,
+        service: str | None,
+        file: str | None,
+        line: int | None,
+        context: tuple[str, ...],
+        stack: tuple[str, ...] | None,
+    ):
+        self.code = code
+        self.severity = severity
+        self.message = message
+        self.service = service
+        self.file = file
+        self.line = line
+        self.context = context
+        self.stack = stack
+
+    def attributed_to(self, service: str | None) -> 'Diagnostic':
+        """Returns this diagnostic as if it had been emitted while processing another service.
+
+        The file and line stay the same, since they refer to where the finding is, not to who ran into it.
+        """
+        if service == self.service:
+            return self
+        return Diagnostic(self.code, self.severity, self.message, service, self.file, self.line, self.context, self.stack)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+_DIAGNOSTIC_CODES: dict[str, str] = {}
+
+def diagnostic_code(msg: str) -> str:
+    """Derives a stable code from a warning message, e.g. "Couldn't find $services" → "couldn-t-find-services"."""
+    code = _DIAGNOSTIC_CODES.get(msg)
+    if code is None:
+        code = re.sub(r"[^a-z0-9]+", "-", msg.lower()).strip("-")
+        _DIAGNOSTIC_CODES[msg] = code
+    return code
+
+class DiagnosticsEngine:
+    """Collects diagnostics, renders them, and checks their amounts against per-code budgets."""
+    __slots__ = ('records', 'counts', 'messages', 'budgets', 'default_budget', 'verbose', 'format', 'captures')
+    records: list[Diagnostic]
+    counts: dict[str, int]
+    messages: dict[str, str]
+    budgets: dict[str, int]
+    default_budget: int
+    verbose: bool
+    format: str
+    captures: list[list[Diagnostic]]
+
+    def __init__(self):
+        self.records = []
+        self.counts = {}
+        self.messages = {}
+        self.budgets = {}
+        self.default_budget = 0
+        self.verbose = False
+        self.format = "terminal"
+        self.captures = []
+
+    def reset(self):
+        """Forgets all diagnostics emitted so far, but keeps the configuration."""
+        self.records = []
+        self.counts = {}
+        self.messages = {}
+
+    def emit(self, diag: Diagnostic, render: bool = True):
+        """Adds a diagnostic, or hands it to the innermost capture if there is one.
+
+        :param Diagnostic diag: The diagnostic to add.
+        :param bool render: Whether to print the diagnostic right away, if the output format allows it.
+        """
+        if len(self.captures) > 0:
+            self.captures[-1].append(diag)
+            return
+
+        self.records.append(diag)
+        self.counts[diag.code] = self.counts.get(diag.code, 0) + 1
+        self.messages.setdefault(diag.code, diag.message)
+        if render and self.format == "terminal":
+            self.render(diag)
+
+    @contextmanager
+    def capture(self):
+        """Collects all diagnostics emitted within into a list, instead of adding them."""
+        captured: list[Diagnostic] = []
+        self.captures.append(captured)
+        try:
+            yield captured
+        finally:
+            self.captures.remove(captured)
+
+    def render(self, diag: Diagnostic):
+        """Prints a diagnostic to the console."""
+        WARN = "\033[0m\033[43m\033[30mWARN:\033[0m "
+        WARN_TAB = "\033[0m    \033[43m\033[33m|\033[0m "
+        WARN_TAB_LAST = "\033[0m    \033[43m\033[33m\033[58;5;0m\033[4m|\033[0m "
+
+        service_msg: str
+        if diag.service is None:
+            service_msg = ""
+        else:
+            service_msg = f"in service \033[36m{diag.service}\033[0m "
 
-    :param str msg: The warning message to print.
-    :param Any *context: Any contextual info to be passed along.
+        if diag.line is not None:
+            service_msg += f"at \033[36m{diag.file}:{diag.line}\033[0m "
+
+        stack_msg = ""
+        if diag.stack is not None:
+            stack_msg = "(" + " -> ".join([f"\033[34m{name}\033[0m" for name in diag.stack]) + ")"
+
+        context_formatted = [f"\n{c}\033[0m".replace('\n', f"\n\033[0m{WARN_TAB}  \033[2m") for c in diag.context]
+        if len(context_formatted) > 0:
+            context_formatted[-1] = context_formatted[-1].replace(WARN_TAB, WARN_TAB_LAST)
+
+        print(
+            f"{WARN}\033[31m{diag.message}\033[0m \033[2m[{diag.code}]\033[0m {service_msg}{stack_msg}".rstrip(),
+            *context_formatted,
+            file=sys.stderr,
+            sep=""
+        )
+
+    def over_budget(self) -> dict[str, tuple[int, int]]:
+        """Returns the count and budget of every code that was emitted more often than its budget allows."""
+        result = {}
+        for code, count in self.counts.items():
+            budget = self.budgets.get(code, self.default_budget)
+            if count > budget:
+                result[code] = (count, budget)
+        return result
+
+    def summary(self, servicecount: int) -> bool:
+        """Prints a summary of all diagnostics, if the output format is the terminal.
+
+        :param int servicecount: The amount of services that were checked.
+        :returns: Whether any code exceeded its budget.
+        """
+        over = self.over_budget()
+        if self.format != "terminal" or len(self.counts) == 0:
+            return len(over) > 0
+
+        total_warns = len(self.records)
+        print(f"printed \033[33m{total_warns}\033[0m warnings in total (\033[33m{total_warns / max(servicecount, 1):.2f}\033[0m per \033[36mservice\033[0m)", file=sys.stderr)
+        for code, count in self.counts.items():
+            budget_msg = ""
+            if len(self.budgets) > 0 or self.default_budget > 0:
+                budget = self.budgets.get(code, self.default_budget)
+                if code in over:
+                    budget_msg = f" \033[41m\033[30mover budget ({budget})\033[0m"
+                else:
+                    budget_msg = f" (budget {budget})"
+            print(f"\033[33m{count:02d}\033[0mx \033[31m{self.messages[code]}\033[0m \033[2m[{code}]\033[0m{budget_msg}", file=sys.stderr)
+        return len(over) > 0
+
+    def report(self) -> dict[str, Any]:
+        """Returns all diagnostics in the requested machine-readable format (json or sarif)."""
+        if self.format == "sarif":
+            return self._sarif()
+        return {
+            "diagnostics": [diag.as_dict() for diag in self.records],
+            "counts": self.counts,
+            "over_budget": {code: {"count": count, "budget": budget} for code, (count, budget) in self.over_budget().items()},
+        }
+
+    def _sarif(self) -> dict[str, Any]:
+        results = []
+        for diag in self.records:
+            result: dict[str, Any] = {
+                "ruleId": diag.code,
+                "level": diag.severity,
+                "message": {"text": "\n".join((diag.message,) + diag.context)},
+                "properties": {"service": diag.service},
+            }
+            if diag.file is not None:
+                location: dict[str, Any] = {"artifactLocation": {"uri": diag.file}}
+                if diag.line is not None:
+                    location["region"] = {"startLine": diag.line}
+                result["locations"] = [{"physicalLocation": location}]
+            results.append(result)
+
+        return {
+            "$schema": "https://json.schemastore.org/sarif-2.1.0.json",
+            "version": "2.1.0",
+            "runs": [{
+                "tool": {"driver": {
+                    "name": "document_services",
+                    "rules": [{"id": code, "shortDescription": {"text": msg}} for code, msg in self.messages.items()],
+                }},
+                "results": results,
+            }],
+        }
+
+DIAGNOSTICS = DiagnosticsEngine()
+
+@contextmanager
+def attribute(service: str | None, file: str | None, line: int | None = None):
+    """Attributes all diagnostics emitted within to a service, file and (if known) line."""
+    global CURRENT_SERVICE, CURRENT_FILE, CURRENT_LINE
+    outer = CURRENT_SERVICE, CURRENT_FILE, CURRENT_LINE
+    CURRENT_SERVICE, CURRENT_FILE, CURRENT_LINE = service, file, line
+    try:
+        yield
+    finally:
+        CURRENT_SERVICE, CURRENT_FILE, CURRENT_LINE = outer
+
+def at(file: str | None, line: int | None = None) -> AbstractContextManager[None]:
+    """Attributes all diagnostics emitted within to a location, keeping the current service."""
+    return attribute(CURRENT_SERVICE, file, line)
+
+class Recording:
+    """Collects the diagnostics and source dependencies of a unit of work, so that they can be replayed later."""
+    __slots__ = ('warnings', 'dependencies')
+    warnings: list[Diagnostic]
+    dependencies: set[str]
+
+    def __init__(self):
+        self.warnings = []
+        self.dependencies = set()
+
+    def __enter__(self) -> 'Recording':
+        RECORDINGS.append(self)
+        return self
+
+    def __exit__(self, *exc_info: Any):
+        RECORDINGS.remove(self)
+
+    def replay(self):
+        """Re-emits everything recorded, as if the recorded work had been done again."""
+        for fp in self.dependencies:
+            depend(fp)
+        for diag in self.warnings:
+            _emit(diag.attributed_to(CURRENT_SERVICE))
+
+RECORDINGS: list[Recording] = []
+
+def depend(fp: str):
+    """Marks a file as a dependency of everything that's currently being recorded.
+
+    :param str fp: The path of the file. Doesn't need to exist, since a file appearing may change results too.
     """
-    WARN = "\033[0m\033[43m\033[30mWARN:\033[0m "
-    WARN_TAB = "\033[0m    \033[43m\033[33m|\033[0m "
-    WARN_TAB_LAST = "\033[0m    \033[43m\033[33m\033[58;5;0m\033[4m|\033[0m "
+    if len(RECORDINGS) > 0:
+        fp = path.relpath(fp)
+        for recording in RECORDINGS:
+            recording.dependencies.add(fp)
 
-    WARNCOUNT[msg] = (WARNCOUNT.get(msg) or 0) + 1
+def _emit(diag: Diagnostic):
+    for recording in RECORDINGS:
+        recording.warnings.append(diag)
+    DIAGNOSTICS.emit(diag)
 
-    stack = tb.extract_stack()
-    stack_str = " -> ".join([f"\033[34m{frame.name}\033[0m" for frame in stack if frame != stack[-1]])
+def warn(msg: str, *context: Any, line: int | None = None, severity: str = "warning"):
+    """Emits a warning, attributed to the service and location currently being processed.
 
-    service_msg: str
-    if CURRENT_SERVICE is None:
-        service_msg = ""
-    else:
-        service_msg = f"in service \033[36m{CURRENT_SERVICE}\033[0m "
-
-    context = tuple(f"{c}".strip() for c in context)
-    context_formatted = [f"\n{c}\033[0m".replace('\n', f"\n\033[0m{WARN_TAB}  \033[2m") for c in context]
-    if len(context_formatted) > 0:
-        context_formatted[-1] = context_formatted[-1].replace(WARN_TAB, WARN_TAB_LAST)
-
-    print(
-        f"{WARN}\033[31m{msg}\033[0m {service_msg}({stack_str})",
-        *context_formatted,
-        file=sys.stderr,
-        sep=""
-    )
+    The call stack is only captured if verbose output was requested.
+
+    :param str msg: The warning message. Also determines the diagnostic's code.
+    :param Any *context: Any contextual info to be passed along.
+    :param int | None line: The line in the current file the warning refers to, if more precise than the current one.
+    :param str severity: The SARIF level of the warning.
+    """
+    stack: tuple[str, ...] | None = None
+    if DIAGNOSTICS.verbose:
+        names = []
+        frame = sys._getframe(1)
+        while frame is not None:
+            names.append(frame.f_code.co_name)
+            if frame.f_code.co_name == 'process_service':
+                # service-level warnings only show the stack from process_service downwards,
+                # so that the output is the same no matter which process handled the service
+                break
+            frame = frame.f_back
+        stack = tuple(reversed(names))
+
+    _emit(Diagnostic(
+        diagnostic_code(msg),
+        severity,
+        msg,
+        CURRENT_SERVICE,
+        CURRENT_FILE,
+        line if line is not None else CURRENT_LINE,
+        tuple(f"{c}".strip() for c in context),
+        stack,
+    ))
+
+class SourceCache:
+    """Process-wide cache of source files, so that every file is read from disk at most once per run.
+
+    Entries are keyed by absolute path and revalidated against the file's mtime and size,
+    which keeps the cache correct if files change while the process is alive.
+    """
+    __slots__ = ('entries', 'digests', 'structures', 'hits', 'misses')
+    entries: dict[str, tuple[int, int, str]]
+    digests: dict[str, str]
+    structures: dict[str, 'PHPFile']
+    hits: int
+    misses: int
+
+    def __init__(self):
+        self.entries = {}
+        self.digests = {}
+        self.structures = {}
+        self.hits = 0
+        self.misses = 0
+
+    def read(self, fp: str, track: bool = True) -> str:
+        """Returns the contents of a file, reading it from disk only if it isn't cached or has changed since.
+
+        :param str fp: The path of the file to read.
+        :param bool track: Whether to record the file as a dependency of the work currently being recorded.
+        :raises FileNotFoundError: If the file doesn't exist.
+        """
+        if track:
+            depend(fp)
+        key = path.abspath(fp)
+        st = stat(key)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            self.hits += 1
+            return entry[2]
+
+        self.misses += 1
+        with open(key, "r") as f:
+            content = f.read()
+        self.entries[key] = (st.st_mtime_ns, st.st_size, content)
+        self.digests.pop(key, None)
+        return content
+
+    def structure(self, fp: str, track: bool = True) -> 'PHPFile':
+        """Returns the scanned structure of a PHP file, scanning it only once per version of the file.
+
+        :param str fp: The path of the file to scan.
+        :param bool track: Whether to record the file as a dependency of the work currently being recorded.
+        :raises FileNotFoundError: If the file doesn't exist.
+        """
+        content = self.read(fp, track)
+        key = path.abspath(fp)
+        structure = self.structures.get(key)
+        if structure is None or structure.code is not content:
+            structure = scan_php(content)
+            self.structures[key] = structure
+        return structure
+
+    def digest(self, fp: str) -> str | None:
+        """Returns a hash of the contents of a file, or None if it doesn't exist.
+
+        :param str fp: The path of the file to hash.
+        """
+        try:
+            content = self.read(fp, track=False)
+        except FileNotFoundError:
+            return None
+        key = path.abspath(fp)
+        digest = self.digests.get(key)
+        if digest is None:
+            digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+            self.digests[key] = digest
+        return digest
+
+SOURCES = SourceCache()
+
+class GitMetadata:
+    """Last-modification dates of every file below a directory, gathered in a single ``git log`` run.
+
+    Files git doesn't know about (e.g. new, uncommitted files) fall back to their filesystem mtime.
+    """
+    __slots__ = ('root', 'dates')
+    root: str
+    dates: dict[str, date] | None
+
+    def __init__(self, root: str):
+        self.root = root
+        self.dates = None
+
+    def load(self) -> dict[str, date]:
+        """Runs ``git log`` over the whole tree and maps every path to the date of the latest commit touching it."""
+        if self.dates is None:
+            self.dates = self._log([self.root])
+        return self.dates
+
+    @staticmethod
+    def _log(paths: list[str]) -> dict[str, date]:
+        """Returns the date of the latest commit touching every file below the given paths."""
+        dates: dict[str, date] = {}
+        try:
+            with Popen(
+                ["git", "-c", "core.quotePath=false", "log", "--pretty=format:%x00%as", "--name-only", "--", *paths],
+                stdout=PIPE,
+                stderr=DEVNULL,
+            ) as p:
+                output = p.communicate()[0].decode('utf-8')
+        except OSError:
+            return dates
+
+        current: date | None = None
+        for line in output.splitlines():
+            if line.startswith('\0'):
+                current = date.fromisoformat(line[1:])
+            elif len(line) > 0 and current is not None:
+                # git log lists newest commits first, so the first date we see for a path is the latest one
+                dates.setdefault(path.normpath(line), current)
+        return dates
+
+    def invalidate(self, changed: set[str]):
+        """Asks git again about the given files only, keeping the dates of all others.
+
+        :param set[str] changed: Paths of added, removed or modified files, relative to the repository root.
+        """
+        if self.dates is None:
+            return
+        changed = {path.normpath(fp) for fp in changed}
+        for fp in changed:
+            self.dates.pop(fp, None)
+        existing = sorted(fp for fp in changed if path.exists(fp))
+        if len(existing) > 0:
+            self.dates.update(self._log(existing))
+
+    def reset(self):
+        """Forgets all dates, so that the next lookup asks git again."""
+        self.dates = None
+
+    def last_modified(self, fp: str) -> date:
+        """Returns the date a file was last modified, according to git if possible.
+
+        :param str fp: The path of the file, relative to the repository root.
+        """
+        modified = self.load().get(path.normpath(fp))
+        if modified is None:
+            modified = date.fromtimestamp(stat(fp).st_mtime)
+        return modified
+
+GIT = GitMetadata("lbplanner")
+
+class Profiler:
+    """Collects the timings of the phases of a run and of the steps of every service.
+
+    Optionally also records tracemalloc peaks per phase and per service.
+    """
+    __slots__ = ('phases', 'services', 'service_peaks', 'phase_peaks', 'current', 'memory', 'depth')
+    phases: dict[str, float]
+    services: dict[str, dict[str, float]]
+    service_peaks: dict[str, int]
+    phase_peaks: dict[str, int]
+    current: str | None
+    memory: bool
+    depth: int
+
+    def __init__(self, memory: bool):
+        self.phases = {}
+        self.services = {}
+        self.service_peaks = {}
+        self.phase_peaks = {}
+        self.current = None
+        self.memory = memory
+        self.depth = 0
+        if memory:
+            tracemalloc.start()
+
+    @contextmanager
+    def measure(self, name: str):
+        """Times a phase, or a step of the current service if there is one. Nested measurements are added up too.
+
+        :param str name: The name of the phase or step.
+        """
+        toplevel = self.current is None and self.depth == 0
+        if toplevel and self.memory:
+            tracemalloc.reset_peak()
+        self.depth += 1
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - start
+            self.depth -= 1
+            target = self.phases if self.current is None else self.services[self.current]
+            target[name] = target.get(name, 0.0) + elapsed
+            if toplevel and self.memory:
+                self.phase_peaks[name] = max(self.phase_peaks.get(name, 0), tracemalloc.get_traced_memory()[1])
+
+    @contextmanager
+    def service(self, name: str):
+        """Attributes all measurements within to a service.
+
+        :param str name: The name of the service.
+        """
+        outer = self.current
+        self.current = name
+        self.services[name] = {}
+        if self.memory:
+            tracemalloc.reset_peak()
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.services[name]["total"] = perf_counter() - start
+            if self.memory:
+                self.service_peaks[name] = tracemalloc.get_traced_memory()[1]
+            self.current = outer
+
+    def report(self, slowest: int = 10) -> dict[str, Any]:
+        """Returns all collected data, ready to be serialized to JSON.
+
+        :param int slowest: How many of the slowest services to list.
+        """
+        steps: dict[str, float] = {}
+        for timings in self.services.values():
+            for step, secs in timings.items():
+                if step != "total":
+                    steps[step] = steps.get(step, 0.0) + secs
+
+        ranked = sorted(self.services.items(), key=lambda item: item[1].get("total", 0.0), reverse=True)
+        report: dict[str, Any] = {
+            "phases": self.phases,
+            "service_steps": steps,
+            "slowest_services": [
+                {"service": name, "seconds": timings, "memory_peak": self.service_peaks.get(name)}
+                for name, timings in ranked[:slowest]
+            ],
+            "member_resolutions": [
+                {"member": f"{classname}::{funcname}()", "file": path.relpath(fp), "uses": uses}
+                for (fp, classname, funcname), uses in sorted(MEMBERS.uses.items(), key=lambda item: item[1], reverse=True)
+            ],
+            "caches": {
+                "sources": {"hits": SOURCES.hits, "misses": SOURCES.misses},
+                "members": {"hits": MEMBERS.hits, "misses": MEMBERS.misses},
+            },
+            "services": self.services,
+        }
+        if self.memory:
+            report["memory_peaks"] = self.phase_peaks
+        return report
+
+PROFILER: Profiler | None = None
+
+def timer(name: str) -> AbstractContextManager[Any]:
+    """Times a phase or step if profiling is enabled, or does nothing otherwise.
+
+    :param str name: The name of the phase or step.
+    """
+    if PROFILER is None:
+        return nullcontext()
+    return PROFILER.measure(name)
+
+def reset_state():
+    """Forgets all process-wide caches and warnings, e.g. before processing a different plugin tree."""
+    global CURRENT_SERVICE, CURRENT_FILE, CURRENT_LINE
+    DIAGNOSTICS.reset()
+    CURRENT_SERVICE = None
+    CURRENT_FILE = None
+    CURRENT_LINE = None
+    SOURCES.__init__()
+    MEMBERS.__init__()
+    ENUMS.reset()
+    SYMBOLS.reset()
+    CALLS.reset()
+    GIT.reset()
+    IR_NODES.reset()
 
 def convert_php_type_to_normal_type(php_type: str) -> tuple[str, bool]:
     CONVERSIONS = {
@@ -115,13 +672,41 @@ def parse_nullable(inpot: str) -> bool | None:
         return None
 
 class PHPNameResolution:
-    __slots__ = ('namespace', 'imports')
+    """The namespace and ``use`` statements of a file, with every imported name mapped to the class it refers to."""
+    __slots__ = ('namespace', 'imports', 'aliases', 'conflicts')
     namespace: str | None
     imports: list[str]
+    aliases: dict[str, str]
+    conflicts: dict[str, list[str]]
 
-    def __init__(self, namespace: str | None, imports: list[str]):
+    def __init__(
+        self,
+        namespace: str | None,
+        imports: list[str],
+        aliases: dict[str, str] | None = None,
+        conflicts: dict[str, list[str]] | None = None,
+    ):
         self.namespace = namespace
         self.imports = imports
+        self.aliases = aliases if aliases is not None else {}
+        self.conflicts = conflicts if conflicts is not None else {}
+
+    def qualify(self, symbol: str) -> str | None:
+        """Returns the fully qualified name a class name refers to in this file.
+
+        :param str symbol: The class name as written in the code.
+        :returns: The fully qualified name, without a leading backslash, or None if the name is ambiguous.
+        """
+        if symbol in self.conflicts:
+            return None
+        if symbol.startswith('\\'):
+            return symbol[1:]
+        alias = self.aliases.get(symbol)
+        if alias is not None:
+            return alias
+        if self.namespace is not None:
+            return f"local_lbplanner\\{self.namespace}\\{symbol}"
+        return symbol
 
     def __str__(self) -> str:
         statements = []
@@ -203,61 +788,270 @@ class PHPClassMemberFunction(PHPExpression):
         self.fp = fp
 
     def resolve(self) -> PHPExpression:
-        meth_pattern = rf"public static function {self.funcname}\(\)(?: ?: ?\w+)? ?{{(?P<body>.*?)}}"
-
         if self.fp is None:
             # already warned in parse_imports, we don't need to warn again
             return PHPConstant('null')
 
-        with open(self.fp, "r") as f:
-            new_file_content = f.read()
+        return MEMBERS.resolve(self)
+
+    def resolve_uncached(self) -> PHPExpression:
+        assert self.fp is not None
+        structure = SOURCES.structure(self.fp)
 
-        meth_matches: list[str] = re.findall(meth_pattern, new_file_content, re.DOTALL)
-        if len(meth_matches) == 0:
+        cls = structure.find_class(self.classname)
+        candidates = cls.methods if cls is not None else [m for c in structure.classes for m in c.methods]
+        methods = [
+            method for method in candidates
+            if method.name == self.funcname and method.is_public_static() and method.params.strip() == ''
+        ]
+        if len(methods) == 0:
             warn("Missing class member", f"couldn't find {self} inside {self.fp}")
             return PHPConstant('null')
-        elif len(meth_matches) > 1:
+        elif len(methods) > 1:
             raise Exception(f"Found multiple definitions for {self} inside {self.fp}")
         else:
-            imports = extract_imports(new_file_content)
-            result = parse_code(meth_matches[0], imports)
+            # whatever goes wrong inside the member is found in its own file, not in the one referencing it
+            with at(self.fp):
+                result = parse_code(structure.code, structure.name_resolution(), methods[0].body_start + 1)
 
             return result
 
     def __str__(self) -> str:
         return f"{self.classname}::{self.funcname}()"
 
-class PHPEnum():
-    @classmethod
-    def getcases(cls, classname: str) -> dict[str, str]:
+class MemberCache:
+    """Memoizes resolved class members by (file, class, function), so every structure only gets parsed once per run.
+
+    Warnings and dependencies recorded while resolving a member are replayed whenever the cached result is reused,
+    so every service referencing a faulty structure still gets told about it.
+    """
+    __slots__ = ('entries', 'active', 'uses', 'hits', 'misses')
+    entries: dict[tuple[str, str, str], tuple[PHPExpression, Recording]]
+    active: set[tuple[str, str, str]]
+    uses: dict[tuple[str, str, str], int]
+    hits: int
+    misses: int
+
+    def __init__(self):
+        self.entries = {}
+        self.active = set()
+        self.uses = {}
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, member: PHPClassMemberFunction) -> PHPExpression:
+        """Returns the expression a class member returns, parsing it only if it hasn't been parsed before.
+
+        :param PHPClassMemberFunction member: The class member to resolve. Its file path must be known.
+        """
+        assert member.fp is not None
+        key = (path.abspath(member.fp), member.classname, member.funcname)
+        self.uses[key] = self.uses.get(key, 0) + 1
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            entry[1].replay()
+            return entry[0]
+
+        if key in self.active:
+            warn("recursive class member reference", f"{member} inside {member.fp}")
+            return PHPConstant('null')
+
+        self.misses += 1
+        self.active.add(key)
+        try:
+            with Recording() as recording:
+                result = member.resolve_uncached()
+        finally:
+            self.active.remove(key)
+
+        self.entries[key] = (result, recording)
+        return result
+
+    def invalidate(self, changed: set[str]):
+        """Forgets every member that depends on any of the given files.
+
+        :param set[str] changed: Paths of changed files, relative to the working directory.
+        """
+        for key in [key for key, entry in self.entries.items() if not changed.isdisjoint(entry[1].dependencies)]:
+            del self.entries[key]
+
+MEMBERS = MemberCache()
+
+class EnumRegistry:
+    """Index of all enums in the plugin, built once on first use.
+
+    Every enum file gets parsed a single time, inheritance chains get flattened once,
+    and afterwards case lookups and ``format()`` strings are served from memory.
+    """
+    __slots__ = ('root', 'cases', 'formats', 'broken', 'chains')
+    root: str
+    cases: dict[str, dict[str, str]] | None
+    formats: dict[str, str]
+    broken: set[str]
+    chains: dict[str, tuple[str, ...]]
+
+    def __init__(self, root: str):
+        self.root = root
+        self.cases = None
+        self.formats = {}
+        self.broken = set()
+        self.chains = {}
+
+    def load(self) -> dict[str, dict[str, str]]:
+        """Scans the enum directory and resolves all inheritance chains, unless that already happened."""
+        if self.cases is not None:
+            return self.cases
+
         # https://regex101.com/r/p5FzCh
         casepattern = r"const (\w+) = (\d+|true|false|(['\"]).*?\3)"
+        fullbody_pattern = r"class (\w+) extends (Enum|\w+) {(.*?)}"
 
-        fullbody_pattern = f"class {classname} extends (Enum|\\w+) {{(.*?)}}"
-
-        cases = {}
+        own: dict[str, tuple[str, dict[str, str]]] = {}
+        for filename in sorted(listdir(self.root)):
+            if not filename.endswith('.php'):
+                continue
+            classname = filename[:-4]
+            matches: list[list[str]] = [
+                m for m in re.findall(fullbody_pattern, SOURCES.read(path.join(self.root, filename), track=False), re.DOTALL)
+                if m[0] == classname
+            ]
+            if len(matches) != 1:
+                self.broken.add(classname)
+                continue
 
-        fp = f"lbplanner/classes/enums/{classname}.php"
-        if not path.exists(fp):
-            warn("Couldn't find enum file", fp)
-            return {}
-        with open(fp, "r") as f:
-            matches: list[list[str]] = re.findall(fullbody_pattern, f.read(), re.DOTALL)
-            if len(matches) == 1:
-                if matches[0][0] != 'Enum':
-                    cases = cls.getcases(matches[0][0])
-                body = matches[0][1]
+            own_cases = {}
+            for match in re.findall(casepattern, matches[0][2]):
+                own_cases[match[0]] = match[1].replace("'", '"')
+            own[classname] = matches[0][1], own_cases
+
+        self.cases = {}
+
+        def flatten(classname: str, chain: tuple[str, ...]) -> dict[str, str] | None:
+            if classname in self.cases:
+                return self.cases[classname]
+            if classname not in own or classname in chain:
+                self.broken.add(classname)
+                return None
+            parent, own_cases = own[classname]
+            cases = {}
+            if parent != 'Enum':
+                parent_cases = flatten(parent, chain + (classname,))
+                if parent_cases is None:
+                    self.broken.add(classname)
+                    return None
+                cases.update(parent_cases)
+            cases.update(own_cases)
+            self.cases[classname] = cases
+            self.chains[classname] = (classname,) + (self.chains[parent] if parent != 'Enum' else ())
+            return cases
+
+        for classname in own.keys():
+            flatten(classname, ())
+
+        return self.cases
+
+    def reset(self):
+        """Forgets everything, so that the next lookup rescans the enum directory."""
+        self.cases = None
+        self.formats = {}
+        self.broken = set()
+        self.chains = {}
+
+    def getcases(self, classname: str) -> dict[str, str]:
+        """Returns all cases of an enum, including inherited ones, mapped to their PHP values.
+
+        :param str classname: The name of the enum.
+        """
+        cases = self.load().get(classname)
+        for name in self.chains.get(classname, (classname,)):
+            depend(path.join(self.root, f"{name}.php"))
+        if cases is None:
+            if classname in self.broken:
+                with at(path.join(self.root, f"{classname}.php")):
+                    warn("couldn't parse enum", f"name: {classname}")
             else:
-                warn("couldn't parse enum", f"name: {classname}", matches)
+                warn("Couldn't find enum file", path.join(self.root, f"{classname}.php"))
+            return {}
+        return cases
 
-        matches2: list[str] = re.findall(casepattern, body)
-        for match in matches2:
-            val = match[1].replace("'", '"')
-            cases[match[0]] = val
+    def getformat(self, classname: str) -> str:
+        """Returns the documentation string of an enum, as produced by its ``format()`` member.
+
+        :param str classname: The name of the enum.
+        """
+        formatted = self.formats.get(classname)
+        if formatted is None:
+            cases = self.getcases(classname)
+            # capitalizing first letter of each key
+            cases = {"".join([name[0].upper(), name[1:].lower()]): case for name, case in cases.items()}
+            formatted = "{ " + ", ".join([f"{name} = {value}" for name, value in cases.items()]) + " }"
+            if classname in self.load():
+                self.formats[classname] = formatted
+        else:
+            for name in self.chains[classname]:
+                depend(path.join(self.root, f"{name}.php"))
+        return formatted
 
-        return cases
+ENUMS = EnumRegistry("lbplanner/classes/enums")
+
+class SymbolTable:
+    """Index of every class in the plugin by fully qualified name, built once on first use.
+
+    Every class file gets scanned a single time, so resolving a name afterwards is a dict lookup
+    instead of guessing paths and checking whether they exist.
+    """
+    __slots__ = ('root', 'files', 'collisions')
+    root: str
+    files: dict[str, str] | None
+    collisions: dict[str, list[str]]
+
+    def __init__(self, root: str):
+        self.root = root
+        self.files = None
+        self.collisions = {}
+
+    def load(self) -> dict[str, str]:
+        """Scans all PHP files below the root, unless that already happened."""
+        if self.files is not None:
+            return self.files
+
+        self.files = {}
+        for dirpath, dirnames, filenames in walk(self.root):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if not filename.endswith('.php'):
+                    continue
+                fp = path.join(dirpath, filename)
+                structure = SOURCES.structure(fp, track=False)
+                namespace = structure.name_resolution().namespace
+                prefix = "" if namespace is None else f"local_lbplanner\\{namespace}\\"
+                for cls in structure.classes:
+                    fqn = prefix + cls.name
+                    if fqn in self.collisions:
+                        self.collisions[fqn].append(fp)
+                    elif fqn in self.files:
+                        self.collisions[fqn] = [self.files.pop(fqn), fp]
+                    else:
+                        self.files[fqn] = fp
+        return self.files
+
+    def reset(self):
+        """Forgets the index, so the next lookup rescans the tree."""
+        self.files = None
+        self.collisions = {}
+
+    def expected_path(self, fqn: str) -> str | None:
+        """Returns where the autoloader would look for a class of the plugin, or None if it's from elsewhere."""
+        parts = fqn.split('\\')
+        if len(parts) < 2 or parts[0] != "local_lbplanner":
+            return None
+        return path.join(self.root, *parts[1:-1], f"{parts[-1]}.php")
+
+SYMBOLS = SymbolTable("lbplanner/classes")
 
-class PHPEnumCase(PHPEnum, PHPString):
+class PHPEnumCase(PHPString):
     __slots__ = ('classname', 'casename', 'fp')
     classname: str
     casename: str
@@ -269,7 +1063,7 @@ class PHPEnumCase(PHPEnum, PHPString):
         self.fp = fp
 
     def resolve(self) -> PHPString:
-        cases = self.getcases(self.classname)
+        cases = ENUMS.getcases(self.classname)
         if self.casename not in cases.keys():
             warn("enum member not found", f"{self.classname}::{self.casename}", cases)
             return PHPStringLiteral("?")
@@ -287,31 +1081,36 @@ class PHPEnumCase(PHPEnum, PHPString):
     def __str__(self) -> str:
         return f"{self.classname}::{self.casename}"
 
-class PHPEnumFormat(PHPEnum, PHPClassMemberFunction, PHPString):
+class PHPEnumFormat(PHPClassMemberFunction, PHPString):
     def resolve(self) -> PHPString:
-        cases = self.getcases(self.classname)
-        # capitalizing first letter of each key
-        cases = {"".join([name[0].upper(), name[1:].lower()]): case for name, case in cases.items()}
-
-        return PHPStringLiteral("{ " + ", ".join([f"{name} = {value}" for name, value in cases.items()]) + " }")
+        return PHPStringLiteral(ENUMS.getformat(self.classname))
 
     def get_value(self) -> str:
         return self.resolve().get_value()
 
 class PHPConstructor(PHPExpression):
-    __slots__ = ('name', 'parameters')
+    __slots__ = ('name', 'parameters', 'fp', 'line')
 
     name: str
     parameters: list[PHPExpression]
+    fp: str | None
+    line: int | None
 
-    def __init__(self, name: str, params: list[PHPExpression]):
+    def __init__(self, name: str, params: list[PHPExpression], fp: str | None = None, line: int | None = None):
         self.name = name
         self.parameters = params
+        self.fp = fp
+        self.line = line
 
     def __str__(self) -> str:
         return f"new {self.name}(" + ", ".join(str(p) for p in self.parameters) + ")"
 
     def toIR(self) -> 'IRElement':
+        # structures pulled in from other files get converted long after parsing, so the location has to be restored
+        with at(self.fp, self.line):
+            return self._toIR()
+
+    def _toIR(self) -> 'IRElement':
         match self.name:
             case 'external_function_parameters' | 'external_single_structure':
                 assert isinstance(self.parameters[0], PHPArray)
@@ -395,7 +1194,7 @@ class PHPConstructor(PHPExpression):
                 return IRValue(typ, default_value=default, nullable=nullable, description=desc, required=required)
             case _:
                 warn("unkown constructor name", self.name)
-                return IRValue(None, None, nullable=True)
+                return IRValue(None, None, nullable=True, description="", required=True)
 
 class PHPConstant(PHPExpression):
     __slots__ = ('name')
@@ -409,27 +1208,46 @@ class PHPConstant(PHPExpression):
         return self.name
 
 class SlotsDict:
+    __slots__ = ()
+    _all_slots: tuple[str, ...] = ()
+    _json_prefixes: tuple[tuple[str, str], ...] = ()
+    _json_prefixes_sorted: tuple[tuple[str, str], ...] = ()
+
+    def __init_subclass__(cls, **kwargs: Any):
+        super().__init_subclass__(**kwargs)
+        # collecting the slots of the whole class hierarchy once, so instances never have to walk the MRO
+        slots: tuple[str, ...] = tuple()
+        for base in cls.__mro__:
+            if base != SlotsDict and issubclass(base, SlotsDict):
+                slots = base.__dict__.get('__slots__', ()) + slots
+        cls._all_slots = tuple(name for name in dict.fromkeys(slots) if name != '__weakref__')
+        cls._json_prefixes = tuple(
+            (name, ('{' if i == 0 else ', ') + encode_json_string(name) + ': ')
+            for i, name in enumerate(cls._all_slots)
+        )
+        cls._json_prefixes_sorted = tuple(
+            (name, ('{' if i == 0 else ', ') + encode_json_string(name) + ': ')
+            for i, name in enumerate(sorted(cls._all_slots))
+        )
+
     @property
     def __dict__(self):
-        return {name: self.__getattribute__(name) for name in self.get_slots()}
+        return {name: getattr(self, name) for name in self._all_slots}
 
     def get_slots(self):
-        slots = tuple()
-        for cls in self.__class__.__mro__:
-            if cls != SlotsDict and issubclass(cls, SlotsDict):
-                slots = cls.__slots__ + slots
-
-        return slots
+        return self._all_slots
 
 class FunctionInfo(SlotsDict):
-    __slots__ = ('name', 'group', 'capabilities', 'description', 'path')
+    __slots__ = ('name', 'group', 'capabilities', 'description', 'path', 'type', 'ajax')
 
-    def __init__(self, name: str, group: str, capabilities: list[str], description: str, path: str):
+    def __init__(self, name: str, group: str, capabilities: list[str], description: str, path: str, type: str | None, ajax: bool):
         self.name = name
         self.group = group
         self.capabilities = capabilities
         self.description = description
         self.path = path
+        self.type = type
+        self.ajax = ajax
 
 class FunctionInfoEx(FunctionInfo):
     __slots__ = ('parameters', 'returns')
@@ -453,12 +1271,13 @@ class DocString_TypeDescPair(SlotsDict):
         self.description = description
 
 class DocString(SlotsDict):
-    __slots__ = ('description', 'params', 'returns', 'subpackage', 'copyright')
+    __slots__ = ('description', 'params', 'returns', 'subpackage', 'copyright', 'lines')
     description: str
     params: dict[str, DocString_TypeDescPair]
     returns: DocString_TypeDescPair | None
     subpackage: str | None
     copyright: tuple[int, str] | None
+    lines: dict[str, int]
 
     def __init__(
         self,
@@ -467,73 +1286,236 @@ class DocString(SlotsDict):
         returns: DocString_TypeDescPair | None,
         subpackage: str | None,
         copyright: tuple[int, str] | None,
+        lines: dict[str, int] | None = None,
     ):
         self.description = desc
         self.params = params
         self.returns = returns
         self.subpackage = subpackage
         self.copyright = copyright
+        # the line of every @-rule by name, if the position of the docstring is known
+        self.lines = lines if lines is not None else {}
 
 class ExtractedAPIFunction(SlotsDict):
-    __slots__ = ('docstring', 'name', 'params', 'returns', 'body')
+    __slots__ = ('docstring', 'name', 'params', 'returns', 'body', 'start', 'line')
     docstring: DocString
     name: str
     params: dict[str, str]
     returns: str
     body: str
+    start: int
+    line: int
 
-    def __init__(self, docstring: DocString, name: str, params: dict[str, str], returns: str, body: str):
+    def __init__(self, docstring: DocString, name: str, params: dict[str, str], returns: str, body: str, start: int, line: int):
         self.docstring = docstring
         self.name = name
         self.params = params
         self.returns = returns
         self.body = body
+        self.start = start
+        self.line = line
 
 class IRElement(SlotsDict, ABC):
-    __slots__ = ('description', 'required', 'type')
+    """A node of the IR, describing a parameter or return value of a service.
 
-    def __init__(self, description: str, required: bool):
-        self.description = description
-        self.required = required
+    Nodes are immutable and hash-consed: constructing a node that is equal to an existing one returns the existing
+    node, so identical subtrees (e.g. a model structure returned by several services) exist only once in memory
+    and can be compared by identity.
+    """
+    __slots__ = ('description', 'required', 'type', '__weakref__')
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name: str):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    @abstractmethod
+    def __reduce__(self) -> tuple[type, tuple[Any, ...]]:
+        """Pickles the node by its constructor arguments, so that unpickling interns it again."""
+        ...
 
 class IRValue(IRElement):
     __slots__ = ('default_value', 'type', 'nullable')
 
-    def __init__(self, type, default_value, nullable: bool, **kwargs):
-        self.type = type
-        self.default_value = default_value
-        self.nullable = nullable
-        super().__init__(**kwargs)
+    def __new__(cls, type, default_value, nullable: bool, description: str, required: bool) -> 'IRValue':
+        return IR_NODES.intern(
+            cls,
+            (type, default_value, nullable, description, required),
+            {'type': type, 'default_value': default_value, 'nullable': nullable, 'description': description, 'required': required},
+        )
+
+    def __reduce__(self) -> tuple[type, tuple[Any, ...]]:
+        return (IRValue, (self.type, self.default_value, self.nullable, self.description, self.required))
 
 class IRObject(IRElement):
     __slots__ = ('fields',)
-    fields: dict[str, IRElement]
+    fields: MappingProxyType[str, IRElement]
+
+    def __new__(cls, fields: dict[str, IRElement], description: str, required: bool) -> 'IRObject':
+        # the fields are interned already, so they can be keyed by identity
+        return IR_NODES.intern(
+            cls,
+            (tuple(fields.items()), description, required),
+            {'fields': MappingProxyType(dict(fields)), 'type': 'ObjectValue', 'description': description, 'required': required},
+        )
 
-    def __init__(self, fields: dict[str, IRElement], **kwargs):
-        self.fields = fields
-        self.type = 'ObjectValue'
-        super().__init__(**kwargs)
+    def __reduce__(self) -> tuple[type, tuple[Any, ...]]:
+        return (IRObject, (dict(self.fields), self.description, self.required))
 
 class IRArray(IRElement):
     __slots__ = ('value',)
     value: IRElement
 
-    def __init__(self, value: IRElement, **kwargs):
-        self.value = value
-        self.type = 'ArrayValue'
-        super().__init__(**kwargs)
+    def __new__(cls, value: IRElement, description: str, required: bool) -> 'IRArray':
+        return IR_NODES.intern(
+            cls,
+            (value, description, required),
+            {'value': value, 'type': 'ArrayValue', 'description': description, 'required': required},
+        )
+
+    def __reduce__(self) -> tuple[type, tuple[Any, ...]]:
+        return (IRArray, (self.value, self.description, self.required))
+
+IRNode = TypeVar('IRNode', bound=IRElement)
+
+class IRNodeTable:
+    """Process-wide table of all IR nodes, which makes sure every distinct node is only constructed once.
+
+    Nodes are only held weakly, so the ones no result refers to anymore (e.g. after a rebuild in watch mode) get freed.
+    """
+    __slots__ = ('nodes', 'hits', 'misses')
+    nodes: WeakValueDictionary[tuple[type, tuple[Any, ...]], IRElement]
+    hits: int
+    misses: int
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.nodes = WeakValueDictionary()
+        self.hits = 0
+        self.misses = 0
+
+    def intern(self, cls: type[IRNode], key: tuple[Any, ...], attributes: dict[str, Any]) -> IRNode:
+        """Returns the node of a class with the given key, constructing it from the attributes if there is none yet.
+
+        :param type cls: The class of the node.
+        :param tuple key: Everything that distinguishes the node from others of its class. Child nodes are compared by identity.
+        :param dict[str, Any] attributes: The attributes of the node, in case it has to be constructed.
+        """
+        node = self.nodes.get((cls, key))
+        if node is not None:
+            self.hits += 1
+            return node  # type: ignore[return-value]
+        self.misses += 1
+        node = object.__new__(cls)
+        for name, value in attributes.items():
+            object.__setattr__(node, name, value)
+        self.nodes[(cls, key)] = node
+        return node
+
+IR_NODES = IRNodeTable()
+
+def write_json(obj: Any, write: Callable[[str], Any], sort_keys: bool = False, refs: dict[int, str] | None = None):
+    """Serializes an object to JSON, producing the same output as ``json.dumps(obj, default=lambda x: x.__dict__)``.
+
+    SlotsDict instances are written field by field using their precomputed key prefixes,
+    without building an intermediate dict per object.
+
+    :param Any obj: The object to serialize.
+    :param Callable write: Gets called with every chunk of the output, e.g. ``list.append`` or ``file.write``.
+    :param bool sort_keys: Whether to sort the attributes of SlotsDict instances by name.
+        Keys of plain dicts (e.g. parameter names) always keep their source order.
+    :param dict[int, str] | None refs: Definition ids by ``id()`` of SlotsDict instances, see :class:`IRDefinitions`.
+        These instances get written as ``{"$ref": id}`` instead, unless they are ``obj`` itself.
+    """
+    def write_value(o: Any):
+        t = type(o)
+        if t is str:
+            write(encode_json_string(o))
+        elif o is None:
+            write('null')
+        elif o is True:
+            write('true')
+        elif o is False:
+            write('false')
+        elif t is int:
+            write(int.__repr__(o))
+        elif t is float:
+            write(json.dumps(o))
+        elif t is list or t is tuple:
+            if len(o) == 0:
+                write('[]')
+                return
+            write('[')
+            first = True
+            for v in o:
+                if first:
+                    first = False
+                else:
+                    write(', ')
+                write_value(v)
+            write(']')
+        elif t is dict or t is MappingProxyType:
+            if len(o) == 0:
+                write('{}')
+                return
+            write('{')
+            first = True
+            for k, v in o.items():
+                if first:
+                    first = False
+                else:
+                    write(', ')
+                write(encode_json_string(k))
+                write(': ')
+                write_value(v)
+            write('}')
+        elif isinstance(o, SlotsDict):
+            if refs is not None and o is not obj:
+                ref = refs.get(id(o))
+                if ref is not None:
+                    write('{"$ref": ')
+                    write(encode_json_string(ref))
+                    write('}')
+                    return
+            prefixes = o._json_prefixes_sorted if sort_keys else o._json_prefixes
+            if len(prefixes) == 0:
+                write('{}')
+                return
+            for name, prefix in prefixes:
+                write(prefix)
+                write_value(getattr(o, name))
+            write('}')
+        else:
+            raise TypeError(f"Object of type {t.__name__} is not JSON serializable")
+
+    write_value(obj)
+
+def dump_json(obj: Any, sort_keys: bool = False, refs: dict[int, str] | None = None) -> str:
+    """Serializes an object to a JSON string. See :func:`write_json`."""
+    chunks: list[str] = []
+    write_json(obj, chunks.append, sort_keys, refs)
+    return "".join(chunks)
+
+def parse_code(code: str, nr: PHPNameResolution, pos: int = 0) -> PHPExpression:
+    """Parses a function body up to (and including) its return statement.
+
+    The whole parser operates on the one shared ``code`` buffer; every ``parse_*`` function takes the
+    absolute position to start at and returns the absolute position right after whatever it consumed.
 
-def parse_code(code: str, nr: PHPNameResolution) -> PHPExpression:
-    code = code.strip()
+    :param str code: The source buffer.
+    :param PHPNameResolution nr: The namespace and imports of the file the code stems from.
+    :param int pos: Where in ``code`` to start parsing.
+    """
     while True:
-        i, expr = parse_statement(code, nr)
+        pos, expr = parse_statement(code, pos, nr)
         if expr is not None:
             return expr
-        code = code[i:].strip()
 
-def parse_statement(code: str, nr: PHPNameResolution) -> tuple[int, PHPExpression | None]:
+def parse_statement(code: str, i: int, nr: PHPNameResolution) -> tuple[int, PHPExpression | None]:
     buf = []
-    i = 0
     while True:
         c = code[i]
         if c.isalpha() or c == '_':
@@ -549,28 +1531,26 @@ def parse_statement(code: str, nr: PHPNameResolution) -> tuple[int, PHPExpressio
 
             if word == 'global':
                 # just skip this statement; we're not interested in globals
-                return i + code[i:].index(';') + 1, None
+                return code.index(';', i) + 1, None
             elif word == 'return':
-                iplus, expr = parse_expression(code[i:], nr)
-                i += iplus
+                i, expr = parse_expression(code, i, nr)
 
                 return i + 1, expr
             else:
                 raise ValueError(f"unknown keyword: {word}")
         elif c == ';':
             return i + 1, None
-        elif code[i:i + 2] == '//':
-            i += code[i:].index('\n')
+        elif code.startswith('//', i):
+            i = code.index('\n', i)
         else:
             raise ValueError(f"unknown char: {c}")
 
-def parse_expression(code: str, nr: PHPNameResolution) -> tuple[int, PHPExpression | None]:
+def parse_expression(code: str, i: int, nr: PHPNameResolution) -> tuple[int, PHPExpression | None]:
     expr: PHPExpression | None = None
 
     buf: list[str] = []
-    i = 0
     while True:
-        if len(buf) == 0 and code[i:].startswith('$USER->id'):
+        if len(buf) == 0 and code.startswith('$USER->id', i):
             assert expr is None
             i += len('$USER->id')
             expr = PHPUserID()
@@ -589,8 +1569,7 @@ def parse_expression(code: str, nr: PHPNameResolution) -> tuple[int, PHPExpressi
             buf = []
 
             if word == 'new':
-                iplus, expr = parse_constructor(code[i:], nr)
-                i += iplus
+                i, expr = parse_constructor(code, i, nr)
             else:
                 # just assume this is a constant
                 assert expr is None
@@ -601,22 +1580,18 @@ def parse_expression(code: str, nr: PHPNameResolution) -> tuple[int, PHPExpressi
             if len(buf) > 0:
                 raise NotImplementedError("map access not implemented")
 
-            iplus, expr = parse_array(code[i:], nr)
-            i += iplus
+            i, expr = parse_array(code, i, nr)
         elif c in '\'"':
             assert len(buf) == 0
             assert expr is None
 
-            iplus, expr = parse_string(code[i:])
-            i += iplus
+            i, expr = parse_string(code, i)
         elif c == '.':
             assert isinstance(expr, PHPString)
-            i += 1
-            iplus, after = parse_expression(code[i:], nr)
-            i += iplus
+            i, after = parse_expression(code, i + 1, nr)
             assert isinstance(after, PHPString)
             expr = PHPConcat(expr, after)
-        elif code[i:i + 2] == '::':
+        elif code.startswith('::', i):
             # remote value
             assert len(buf) > 0
             assert expr is None
@@ -629,21 +1604,23 @@ def parse_expression(code: str, nr: PHPNameResolution) -> tuple[int, PHPExpressi
             classname = "".join(buf)
             i += iplus
             if is_func:
-                assert code[i:i + 2] == '()'
+                assert code.startswith('()', i)
                 i += 2
                 C: type[PHPClassMemberFunction]
                 fp_import: str | None
                 if membername == 'format':
                     C = PHPEnumFormat
-                    fp_import = path.join(path.dirname(__file__), "lbplanner", "enums", f"{classname}.php")
+                    fp_import = path.join(ENUMS.root, f"{classname}.php")
                 else:
                     C = PHPClassMemberFunction
                     fp_import = find_import(nr, classname)
-                expr = C(classname, membername, fp_import).resolve()
+                with at(CURRENT_FILE, code.count('\n', 0, i) + 1):
+                    expr = C(classname, membername, fp_import).resolve()
                 buf = []
             else:
-                fp_import = path.join(path.dirname(__file__), "lbplanner", "enums", f"{classname}.php")
-                expr = PHPEnumCase(classname, membername, fp_import).resolve()
+                fp_import = path.join(ENUMS.root, f"{classname}.php")
+                with at(CURRENT_FILE, code.count('\n', 0, i) + 1):
+                    expr = PHPEnumCase(classname, membername, fp_import).resolve()
                 buf = []
         else:
             # unkown character? simply bail
@@ -654,36 +1631,34 @@ def parse_expression(code: str, nr: PHPNameResolution) -> tuple[int, PHPExpressi
                 expr = PHPConstant(word)
             return i, expr
 
-def parse_constructor(code: str, nr: PHPNameResolution) -> tuple[int, PHPConstructor]:
+def parse_constructor(code: str, i: int, nr: PHPNameResolution) -> tuple[int, PHPConstructor]:
+    line = code.count('\n', 0, i) + 1
     paramlist: list[PHPExpression] = []
-    fnname, parenth, params = code.partition('(')
+    parenth = code.find('(', i)
+    assert parenth != -1
+    fnname = code[i:parenth]
     assert fnname.replace('_', '').isalpha()
-    assert parenth == '(' # if parenthesis not found, parenth is an empty string
-    offset = len(fnname) + 1
-    i = 0
+    i = parenth + 1
     while True:
-        iplus, expr = parse_expression(params[i:], nr)
-        i += iplus
+        i, expr = parse_expression(code, i, nr)
 
         if expr is not None:
             paramlist.append(expr)
 
-        if params[i] == ',':
+        if code[i] == ',':
             i += 1
-        elif params[i] == ')':
-            return i + offset + 1, PHPConstructor(fnname, paramlist)
+        elif code[i] == ')':
+            return i + 1, PHPConstructor(fnname, paramlist, CURRENT_FILE, line)
         else:
-            raise ValueError(f"unknown char: {params[i]}")
+            raise ValueError(f"unknown char: {code[i]}")
 
-def parse_array(code: str, nr: PHPNameResolution) -> tuple[int, PHPArray]:
+def parse_array(code: str, i: int, nr: PHPNameResolution) -> tuple[int, PHPArray]:
     associative: bool | None = None
     keys: list[PHPString] = []
     vals: list[PHPExpression] = []
 
-    i = 0
     while True:
-        iplus, expr = parse_expression(code[i:], nr)
-        i += iplus
+        i, expr = parse_expression(code, i, nr)
 
         if code[i] == ',':
             i += 1
@@ -691,7 +1666,7 @@ def parse_array(code: str, nr: PHPNameResolution) -> tuple[int, PHPArray]:
             vals.append(expr)
             if associative is None:
                 associative = False
-        elif code[i:i + 2] == '=>':
+        elif code.startswith('=>', i):
             i += 2
             assert isinstance(expr, PHPString)
             keys.append(expr)
@@ -705,14 +1680,14 @@ def parse_array(code: str, nr: PHPNameResolution) -> tuple[int, PHPArray]:
         else:
             raise ValueError(f"unknown char: {code[i]}")
 
-def parse_string(code: str) -> tuple[int, PHPStringLiteral]:
-    quotetype = code[0]
+def parse_string(code: str, i: int) -> tuple[int, PHPStringLiteral]:
+    quotetype = code[i]
     assert quotetype in '\'"'
     simple = quotetype == '\''
     if not simple:
         raise NotImplementedError() # TODO
     result: list[str] = []
-    i = 1
+    i += 1
     while True:
         c = code[i]
         i += 1
@@ -737,6 +1712,219 @@ def parse_string(code: str) -> tuple[int, PHPStringLiteral]:
             if simple:
                 result.append(c)
 
+class PHPMethod:
+    __slots__ = ('name', 'modifiers', 'docstring', 'params', 'returns', 'start', 'body_start', 'body_end', 'line')
+    name: str
+    modifiers: tuple[str, ...]
+    docstring: str | None
+    params: str
+    returns: str
+    start: int
+    body_start: int
+    body_end: int
+    line: int
+
+    def __init__(
+        self,
+        name: str,
+        modifiers: tuple[str, ...],
+        docstring: str | None,
+        params: str,
+        returns: str,
+        start: int,
+        body_start: int,
+        body_end: int,
+        line: int,
+    ):
+        self.name = name
+        self.modifiers = modifiers
+        self.docstring = docstring
+        self.params = params
+        self.returns = returns
+        self.start = start
+        self.body_start = body_start
+        self.body_end = body_end
+        self.line = line
+
+    def is_public_static(self) -> bool:
+        return 'static' in self.modifiers and 'private' not in self.modifiers and 'protected' not in self.modifiers
+
+class PHPClass:
+    __slots__ = ('name', 'parent', 'docstring', 'methods', 'start', 'end')
+    name: str
+    parent: str | None
+    docstring: str | None
+    methods: list[PHPMethod]
+    start: int
+    end: int
+
+    def __init__(self, name: str, parent: str | None, docstring: str | None, start: int):
+        self.name = name
+        self.parent = parent
+        self.docstring = docstring
+        self.methods = []
+        self.start = start
+        self.end = -1
+
+    def find_methods(self, name: str) -> list[PHPMethod]:
+        return [method for method in self.methods if method.name == name]
+
+class PHPFile:
+    """The structure of a PHP file: its classes and their methods, with the docblocks attached to them.
+
+    Method bodies are stored as offsets into :attr:`code`, so they can be parsed in place.
+    """
+    __slots__ = ('code', 'classes', 'names')
+    code: str
+    classes: list[PHPClass]
+    names: PHPNameResolution | None
+
+    def __init__(self, code: str, classes: list[PHPClass]):
+        self.code = code
+        self.classes = classes
+        self.names = None
+
+    def name_resolution(self) -> PHPNameResolution:
+        """Returns the namespace and imports of the file, parsing them only once."""
+        if self.names is None:
+            self.names = extract_imports(self.code)
+        return self.names
+
+    def find_class(self, name: str) -> PHPClass | None:
+        for cls in self.classes:
+            if cls.name == name:
+                return cls
+        return None
+
+    def line_of(self, pos: int) -> int:
+        """Returns the 1-based line number of a position in the code."""
+        return self.code.count('\n', 0, pos) + 1
+
+_PHP_TOKEN_PATTERN = re.compile(
+    r"""
+      (?P<ws>\s+)
+    | (?P<doc>/\*\*.*?\*/)
+    | (?P<comment>/\*.*?\*/|//[^\n]*|\#[^\n]*)
+    | (?P<str>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+    | (?P<var>\$\w+)
+    | (?P<word>[\w\\]+)
+    | (?P<punct>.)
+    """,
+    re.DOTALL | re.VERBOSE,
+)
+
+def tokenize_php(code: str) -> list[tuple[str, int, int]]:
+    """Splits PHP code into (kind, start, end) tokens, dropping whitespace and non-doc comments.
+
+    Strings and comments are single tokens, so braces inside them never confuse the structure scanner.
+    Heredocs are not supported, since the plugin doesn't use them.
+    """
+    tokens = []
+    for match in _PHP_TOKEN_PATTERN.finditer(code):
+        kind = match.lastgroup
+        assert kind is not None
+        if kind in ('ws', 'comment'):
+            continue
+        tokens.append((kind, match.start(), match.end()))
+    return tokens
+
+def scan_php(code: str) -> PHPFile:
+    """Finds all classes, their methods and docblocks in a single linear pass over the code.
+
+    :param str code: The contents of a PHP file.
+    """
+    tokens = tokenize_php(code)
+    classes: list[PHPClass] = []
+
+    def text(idx: int) -> str:
+        return code[tokens[idx][1]:tokens[idx][2]]
+
+    def skip_block(idx: int, opening: str, closing: str) -> int:
+        """Returns the index of the token closing the block opened at idx."""
+        depth = 0
+        while idx < len(tokens):
+            if tokens[idx][0] == 'punct':
+                c = code[tokens[idx][1]]
+                if c == opening:
+                    depth += 1
+                elif c == closing:
+                    depth -= 1
+                    if depth == 0:
+                        return idx
+            idx += 1
+        raise ValueError(f"unclosed '{opening}' in PHP code")
+
+    current: PHPClass | None = None
+    line_pos, line_no = 0, 1
+    doc: str | None = None
+    modifiers: list[str] = []
+    idx = 0
+    while idx < len(tokens):
+        kind, start, end = tokens[idx]
+        if kind == 'doc':
+            doc = code[start:end]
+        elif kind == 'word':
+            word = code[start:end]
+            if word == 'class' and current is None and idx + 1 < len(tokens) and tokens[idx + 1][0] == 'word':
+                name = text(idx + 1)
+                parent = None
+                idx += 2
+                while idx < len(tokens) and text(idx) != '{':
+                    if text(idx) == 'extends':
+                        parent = text(idx + 1)
+                    idx += 1
+                current = PHPClass(name, parent, doc, start)
+                classes.append(current)
+                doc = None
+                modifiers = []
+            elif word == 'function' and current is not None:
+                idx += 1
+                if text(idx) == '&':
+                    idx += 1
+                name = text(idx)
+                paren_open = idx + 1
+                paren_close = skip_block(paren_open, '(', ')')
+                params = code[tokens[paren_open][2]:tokens[paren_close][1]]
+                idx = paren_close + 1
+                returns_start = tokens[idx][1]
+                while text(idx) not in ('{', ';'):
+                    idx += 1
+                returns = code[returns_start:tokens[idx][1]].strip().removeprefix(':').strip()
+                if text(idx) == '{':
+                    body_open = idx
+                    idx = skip_block(body_open, '{', '}')
+                    body = (tokens[body_open][1], tokens[idx][2])
+                else:
+                    body = (tokens[idx][1], tokens[idx][1]) # abstract method
+                line_no += code.count('\n', line_pos, start)
+                line_pos = start
+                current.methods.append(PHPMethod(
+                    name,
+                    tuple(modifiers),
+                    doc,
+                    params,
+                    returns,
+                    start,
+                    body[0],
+                    body[1],
+                    line_no,
+                ))
+                doc = None
+                modifiers = []
+            else:
+                modifiers.append(word)
+        elif kind == 'punct':
+            c = code[start]
+            if c == '}' and current is not None:
+                current.end = end
+                current = None
+            if c in '{};':
+                doc = None
+                modifiers = []
+        idx += 1
+
+    return PHPFile(code, classes)
+
 def extract_function_info(file_content: str) -> list[FunctionInfo]:
     function_infos = []
 
@@ -747,8 +1935,9 @@ def extract_function_info(file_content: str) -> list[FunctionInfo]:
     # https://regex101.com/r/qyzYks
     functions = re.findall(r"'(local_lbplanner_(\w+?)_(\w+))' => \[(.*?)\],", clean_content, re.DOTALL)
 
-    # to make sure we never accidentally duplicate descriptions
-    existing_descriptions = []
+    # to make sure we never accidentally duplicate descriptions or endpoints
+    existing_descriptions: dict[str, str] = {}
+    indexed_functions: dict[tuple[str, str], FunctionInfo] = {}
 
     for function in functions:
         func_dict = {}
@@ -774,15 +1963,31 @@ def extract_function_info(file_content: str) -> list[FunctionInfo]:
         classpath = re.search(r"'classpath' => 'local/(.*?)'", function[3])
         func_dict["path"] = classpath.group(1) if classpath else None
 
-        # Only adding to the list if all information is present
+        # Extracting whether the function only reads data, and whether it may be called via AJAX
+        functype = re.search(r"'type' => '(read|write)'", function[3])
+        ajax = re.search(r"'ajax' => (true|false)", function[3])
+        func_dict["ajax"] = ajax is not None and ajax.group(1) == "true"
+
+        # Only adding to the list if all information is present; a missing type is documented as unknown instead
         if all(value is not None for value in func_dict.values()):
-            finfo = FunctionInfo(**func_dict)
+            if functype is None:
+                warn("missing type for API function", func_dict["name"], "expected 'type' => 'read' or 'type' => 'write'")
+            finfo = FunctionInfo(**func_dict, type=functype.group(1) if functype else None)
+            key = (finfo.group, finfo.name)
+            if key in indexed_functions:
+                warn("duplicated API function in $functions", f"{finfo.group}_{finfo.name}")
+                continue
             function_infos.append(finfo)
+            indexed_functions[key] = finfo
 
             if finfo.description in existing_descriptions:
-                warn("duplicated API function description", finfo.description)
+                warn(
+                    "duplicated API function description",
+                    finfo.description,
+                    f"already used by {existing_descriptions[finfo.description]}",
+                )
             else:
-                existing_descriptions.append(finfo.description)
+                existing_descriptions[finfo.description] = f"{finfo.group}_{finfo.name}"
         else:
             warn("Could not gather all info for API function", func_dict["name"], func_dict)
 
@@ -794,100 +1999,92 @@ def extract_function_info(file_content: str) -> list[FunctionInfo]:
     if services_function_block is None:
         warn("Couldn't find $services")
     else:
-        services_functions = re.findall(r"'local_lbplanner_([a-z]+)_([a-z_]+)'", services_function_block[1])
-
-        function_infos_copy = function_infos.copy()
-        for function in services_functions:
-            # Extracting function name and group
-            func_name = function[1]
-            func_group = function[0]
-
-            found = False
-            for functioninfo in function_infos_copy:
-                if functioninfo.name == func_name and functioninfo.group == func_group:
-                    function_infos_copy.remove(functioninfo)
-                    found = True
-                    break
+        services_functions: dict[tuple[str, str], None] = {}
+        for func_group, func_name in re.findall(r"'local_lbplanner_([a-z]+)_([a-z_]+)'", services_function_block[1]):
+            if (func_group, func_name) in services_functions:
+                warn("duplicated API function in $services", f"{func_group}_{func_name}")
+            services_functions[(func_group, func_name)] = None
 
-            if not found:
-                warn("Couldn't find service function in $functions", f"{func_group}_{func_name}")
+        for func_group, func_name in sorted(services_functions.keys() - indexed_functions.keys()):
+            warn("Couldn't find service function in $functions", f"{func_group}_{func_name}")
 
-        for functioninfo in function_infos_copy:
-            # The ones left here are not in services_function.
-            warn("Couldn't find service function in $services", f"{functioninfo.group}_{functioninfo.name}")
+        for func_group, func_name in sorted(indexed_functions.keys() - services_functions.keys()):
+            warn("Couldn't find service function in $services", f"{func_group}_{func_name}")
 
     # double-checking using existing files
-    function_infos_copy = function_infos.copy()
+    service_files: set[tuple[str, str]] = set()
     searchdir = './lbplanner/services'
-    for subdir in listdir(searchdir):
-        dirpath = path.join(searchdir, subdir)
-        if not path.isdir(dirpath):
+    for subdir_entry in sorted(scandir(searchdir), key=lambda entry: entry.name):
+        subdir = subdir_entry.name
+        dirpath = subdir_entry.path
+        if not subdir_entry.is_dir():
             warn('found file in services folder', subdir)
             continue
 
-        for filename in listdir('lbplanner/services/' + subdir):
-            if path.isdir(filename):
+        for file_entry in sorted(scandir(dirpath), key=lambda entry: entry.name):
+            filename = file_entry.name
+            if file_entry.is_dir():
                 warn('found directory in folder', filename, dirpath)
                 continue
             if not filename.endswith('.php'):
                 warn('found non-php file in folder', filename, dirpath)
                 continue
 
-            for functioninfo in function_infos_copy:
-                if functioninfo.name == filename[:-4] and functioninfo.group == subdir:
-                    function_infos_copy.remove(functioninfo)
-                    found = True
-                    break
+            service_files.add((subdir, filename[:-4]))
 
-            if not found:
-                warn("Couldn't find service function in $function", f"{func_group}_{func_name}")
+    for func_group, func_name in sorted(service_files - indexed_functions.keys()):
+        warn("Couldn't find service function in $functions", f"{func_group}_{func_name}")
 
-    for functioninfo in function_infos_copy:
+    for func_group, func_name in sorted(indexed_functions.keys() - service_files):
         # The ones left here are not in the dirs.
-        warn("Couldn't find file in services folder", f"{functioninfo.group}/{functioninfo.name}.php")
+        warn("Couldn't find file in services folder", f"{func_group}/{func_name}.php")
 
     return function_infos
 
 
-def extract_api_functions(php_code: str, name: str) -> tuple[ExtractedAPIFunction | None, ExtractedAPIFunction | None, ExtractedAPIFunction | None]:
-    # Regular expression to match the function names and bodies
-    # https://regex101.com/r/9GtIMA
-    pattern = re.compile(
-        r"(?P<docstring>    /\*\*\n(?:     \*[^\n]*\n)*?     \*/)\s*public static function (?P<name>\w+(?:_returns|_parameters|))\(\s*(?P<params>(?:\??(?:int|string|bool) \$[a-z]*(?:,\s+)?)*)\)(?:: (?P<returns>[a-z_]+))? (?P<body>{.+?^    }$)",
-        re.DOTALL | re.MULTILINE
-    )
+def extract_api_functions(
+    php_code: str,
+    name: str,
+    structure: PHPFile | None = None,
+) -> tuple[ExtractedAPIFunction | None, ExtractedAPIFunction | None, ExtractedAPIFunction | None]:
+    """Finds the parameters, main and returns functions of a service.
 
-    # Find all matches in the PHP code
-    matches: list[tuple[str, str]] = pattern.findall(php_code)
+    :param str php_code: The contents of the service file.
+    :param str name: The name of the service file, for diagnostics.
+    :param PHPFile | None structure: The already scanned structure of the file, if available.
+    :returns: The parameters, main and returns functions, each None if not found.
+    """
+    if structure is None:
+        structure = scan_php(php_code)
 
     parameters_function = None
     returns_function = None
     main_function = None
 
-    for match in matches:
-        # Extract function name
-        if len(match) == 4:
-            func_docstring, func_name, func_params, func_body = match
-            func_returns = None
-        elif len(match) == 5:
-            func_docstring, func_name, func_params, func_returns, func_body = match
-        else:
-            raise Exception("unreachable")
-
-        function_packed = ExtractedAPIFunction(
-            parse_docstring(func_docstring),
-            func_name,
-            parse_php_function_parameters(func_params),
-            func_returns,
-            func_body
-        )
+    for cls in structure.classes:
+        for method in cls.methods:
+            if not method.is_public_static():
+                continue
 
-        if func_name.endswith("_parameters"):
-            parameters_function = function_packed
-        elif func_name.endswith("_returns"):
-            returns_function = function_packed
-        else:
-            main_function = function_packed
+            if method.docstring is None:
+                warn("missing docstring for API function", method.name, line=method.line)
+
+            function_packed = ExtractedAPIFunction(
+                parse_docstring(method.docstring or "", docstring_line(structure, method.docstring, method.start)),
+                method.name,
+                parse_php_function_parameters(method.params),
+                method.returns,
+                php_code[method.body_start:method.body_end],
+                method.body_start,
+                method.line,
+            )
+
+            if method.name.endswith("_parameters"):
+                parameters_function = function_packed
+            elif method.name.endswith("_returns"):
+                returns_function = function_packed
+            else:
+                main_function = function_packed
 
     if parameters_function is None:
         warn("Couldn't find parameters function", name, php_code)
@@ -898,17 +2095,35 @@ def extract_api_functions(php_code: str, name: str) -> tuple[ExtractedAPIFunctio
 
     return parameters_function, main_function, returns_function
 
-def extract_main_api_docstring(inpot: str) -> DocString:
-    return parse_docstring(inpot[inpot.find('/**'):inpot.find('*/')])
+def extract_main_api_docstring(structure: PHPFile) -> DocString:
+    """Returns the parsed docstring of the (first) class in a file, or an empty one if there is none."""
+    for cls in structure.classes:
+        if cls.docstring is not None:
+            return parse_docstring(cls.docstring, docstring_line(structure, cls.docstring, cls.start))
+    return parse_docstring("")
+
+def docstring_line(structure: PHPFile, docstring: str | None, before: int) -> int | None:
+    """Returns the line a docstring starts at, given the position of the declaration it's attached to."""
+    if docstring is None:
+        return None
+    pos = structure.code.rfind(docstring, 0, before)
+    return structure.line_of(pos) if pos != -1 else None
+
+def parse_docstring(inpot: str, first_line: int | None = None) -> DocString:
+    """Parses a docblock.
 
-def parse_docstring(inpot: str) -> DocString:
+    :param str inpot: The docblock, including its comment delimiters.
+    :param int | None first_line: The line the docblock starts at, if known, so that warnings can point into it.
+    """
     desc_a = []
     params: dict[str, DocString_TypeDescPair] = {}
     returns: DocString_TypeDescPair | None = None
     subpackage: str | None = None
     copyright: tuple[int, str] | None = None
+    lines: dict[str, int] = {}
     isdesc = True
-    for line in inpot.splitlines():
+    for index, line in enumerate(inpot.splitlines()):
+        lineno = None if first_line is None else first_line + index
         strippedline = line[line.find('*') + 1:].strip()
         if strippedline in ('*', ' ', ''):
             continue # empty line, ignore
@@ -920,18 +2135,20 @@ def parse_docstring(inpot: str) -> DocString:
         elif strippedline.startswith('@'):
             isdesc = False
             splitline = strippedline.split(' ')
+            if lineno is not None:
+                lines.setdefault(splitline[0], lineno)
             match splitline[0]:
                 case '@param':
                     if splitline[2] in params:
-                        warn("specified @param twice in docstring", splitline[2])
+                        warn("specified @param twice in docstring", splitline[2], line=lineno)
                     params[splitline[2]] = DocString_TypeDescPair(splitline[1], " ".join(splitline[3:]))
                 case '@return':
                     if returns is not None:
-                        warn("specified @returns twice in docstring")
+                        warn("specified @returns twice in docstring", line=lineno)
                     returns = DocString_TypeDescPair(splitline[1], " ".join(splitline[2:]))
                 case '@package':
                     if splitline[1] != "local_lbplanner":
-                        warn("found @package with invalid value instead of local_lbplanner", splitline[1])
+                        warn("found @package with invalid value instead of local_lbplanner", splitline[1], line=lineno)
                 case '@subpackage':
                     subpackage = " ".join(splitline[1:])
                 case '@copyright':
@@ -939,7 +2156,7 @@ def parse_docstring(inpot: str) -> DocString:
                 case '@throws' | '@see' | '@link' | '@license':
                     pass
                 case unknown:
-                    warn("unknown @-rule", unknown, line)
+                    warn("unknown @-rule", unknown, line, line=lineno)
         elif isdesc:
             desc_a.append(strippedline)
 
@@ -949,7 +2166,7 @@ def parse_docstring(inpot: str) -> DocString:
     if desc.endswith('.'):
         desc = desc[:-1]
 
-    return DocString(desc, params, returns, subpackage, copyright)
+    return DocString(desc, params, returns, subpackage, copyright, lines)
 
 def parse_php_function_parameters(inpot: str) -> dict[str, str]:
     """ "int $a, string $b" → {"a": "int", "b": "string"} """
@@ -962,47 +2179,35 @@ def parse_php_function_parameters(inpot: str) -> dict[str, str]:
     return out
 
 def find_import(nr: PHPNameResolution, symbol: str) -> str | None:
+    """Finds the file declaring a class that is referenced in code.
 
-    def makepath(p: str, symbol: str):
-        return path.join(path.dirname(__file__), "lbplanner", p, f"{symbol}.php")
-
-    namespaces = { # it's technically possible to import from outside /classes/
-        "helpers": "classes/helpers",
-        "enums": "classes/enums",
-        "polyfill": "classes/polyfill",
-        "model": "classes/model",
-    }
-    fp_l: list[str] = []
-    for use in nr.imports:
-        im_symbol = use.split('\\')[-1].replace(';', '')
-        found = False
-        if im_symbol.startswith('{'):
-            for subsymbol in im_symbol[1:-1].split(','):
-                if subsymbol.strip() == symbol:
-                    found = True
-                    break
-        else:
-            found = symbol == im_symbol
-        if not found:
-            continue
-        for namespace, p in namespaces.items():
-            if use.startswith(namespace):
-                fp_l.append(makepath(p, symbol))
-
-    if len(fp_l) == 0 and nr.namespace is not None:
-        fallback = makepath(namespaces[nr.namespace], symbol)
-
-        if path.exists(fallback):
-            fp_l.append(fallback)
-
-    if len(fp_l) > 1:
-        warn("found potential import collision", f"{symbol} in [{nr}]")
+    :param PHPNameResolution nr: The namespace and imports of the file referencing the class.
+    :param str symbol: The class name as written in the code.
+    :returns: The path of the declaring file, or None if it couldn't be determined unambiguously.
+    """
+    if symbol in nr.conflicts:
+        warn("found potential import collision", f"{symbol} in [{nr}]", f"imported as: {', '.join(nr.conflicts[symbol])}")
         return None
-    elif len(fp_l) == 0:
-        warn("couldn't find symbol", f"{symbol} in [{nr}]")
+
+    fqn = nr.qualify(symbol)
+    assert fqn is not None
+    files = SYMBOLS.load()
+    fp = files.get(fqn)
+    if fp is not None:
+        return fp
+
+    if fqn in SYMBOLS.collisions:
+        for candidate in SYMBOLS.collisions[fqn]:
+            depend(candidate)
+        warn("found potential import collision", f"{symbol} in [{nr}]", f"declared in: {', '.join(SYMBOLS.collisions[fqn])}")
         return None
-    else:
-        return fp_l[0]
+
+    # a file appearing where the autoloader would look for the class changes the outcome
+    expected = SYMBOLS.expected_path(fqn)
+    if expected is not None:
+        depend(expected)
+    warn("couldn't find symbol", f"{symbol} in [{nr}]")
+    return None
 
 def extract_imports(input_str: str) -> PHPNameResolution:
     useprefix = "use local_lbplanner\\"
@@ -1017,14 +2222,43 @@ def extract_imports(input_str: str) -> PHPNameResolution:
             assert namespace is None
             namespace = line.removeprefix(nsprefix).removesuffix(';')
 
-    return PHPNameResolution(namespace, imports)
+    aliases: dict[str, str] = {}
+    conflicts: dict[str, list[str]] = {}
+
+    def add_alias(fqn: str, alias: str | None):
+        fqn = fqn.strip().removeprefix('\\')
+        if alias is None:
+            alias = fqn.split('\\')[-1]
+        previous = aliases.get(alias)
+        if alias in conflicts:
+            conflicts[alias].append(fqn)
+        elif previous is not None and previous != fqn:
+            conflicts[alias] = [aliases.pop(alias), fqn]
+        else:
+            aliases[alias] = fqn
+
+    for match in re.finditer(r"^use\s+(?!function\b|const\b)([^;{]*?)(?:\{([^}]*)\})?\s*;", input_str, re.MULTILINE):
+        base, group = match.group(1).strip(), match.group(2)
+        for item in (group.split(',') if group is not None else ['']):
+            item = item.strip()
+            if group is not None and item == '':
+                continue # trailing comma
+            name, _, alias = f"{base}{item}".partition(" as ")
+            add_alias(name, alias.strip() or None)
+
+    return PHPNameResolution(namespace, imports, aliases, conflicts)
 
-def parse_function(input_text: str, nr: PHPNameResolution) -> IRElement | None:
-    ss = input_text.index('{')
-    se = input_text.rindex('}')
-    func_body = input_text[ss + 1:se]
+def parse_function(input_text: str, nr: PHPNameResolution, pos: int = 0) -> IRElement | None:
+    """Parses the structure a parameters or returns function returns, and converts it to the IR.
 
-    expr = parse_code(func_body, nr)
+    :param str input_text: The code containing the function body.
+    :param PHPNameResolution nr: The namespace and imports of the file the code stems from.
+    :param int pos: Where the function body starts in ``input_text``; positions stay absolute so lines are right.
+    """
+    ss = input_text.index('{', pos)
+
+    with timer("parse"):
+        expr = parse_code(input_text, nr, ss + 1)
 
     if isinstance(expr, PHPConstant) and expr.name == 'null':
         return None
@@ -1032,154 +2266,2205 @@ def parse_function(input_text: str, nr: PHPNameResolution) -> IRElement | None:
         warn("non-constructor at top level", expr)
         return None
 
-    topelement = expr.toIR()
+    with timer("ir"):
+        topelement = expr.toIR()
     if isinstance(topelement, IRObject) and len(topelement.fields) == 0:
         return None
     else:
         return topelement
 
 
-def main() -> None:
-    global CURRENT_SERVICE
-    with open("lbplanner/db/services.php", "r") as file:
-        content = file.read()
-
-    infos = extract_function_info(content)
-
-    complete_info = []
-
-    for i, info in enumerate(infos):
+def process_service(info: FunctionInfo) -> FunctionInfoEx | None:
+    """Extracts the parameters and return values of a single service and checks it for inconsistencies.
 
-        CURRENT_SERVICE = info.name
+    :param FunctionInfo info: The service to process.
+    :returns: The extended info about the service, or None if it couldn't be extracted.
+    """
+    with attribute(info.name, info.path):
+        if PROFILER is None:
+            return _process_service(info)
+        with PROFILER.service(f"{info.group}_{info.name}"):
+            return _process_service(info)
+
+def _process_service(info: FunctionInfo) -> FunctionInfoEx | None:
+    with timer("read"):
+        structure = SOURCES.structure(info.path)
+    func_content = structure.code
+
+    with timer("extract"):
+        imports = structure.name_resolution()
+        params_func, main_func, returns_func = extract_api_functions(func_content, info.path, structure)
+        main_docstring = extract_main_api_docstring(structure)
+
+    if returns_func is None or params_func is None:
+        return None
 
-        with open(info.path, "r") as func_file:
-            func_content = func_file.read()
+    returns = parse_function(func_content, imports, returns_func.start)
 
-        imports = extract_imports(func_content)
-        params_func, main_func, returns_func = extract_api_functions(func_content, info.path)
-        main_docstring = extract_main_api_docstring(func_content)
+    params = parse_function(func_content, imports, params_func.start)
 
-        if returns_func is None or params_func is None:
-            continue
+    result = FunctionInfoEx(info, params, returns)
 
-        returns = parse_function(returns_func.body, imports)
+    with timer("cross-check"):
+        check_service(info, params, main_func, main_docstring)
 
-        params = parse_function(params_func.body, imports)
+    return result
 
-        complete_info.append(FunctionInfoEx(info, params, returns))
+def check_service(
+    info: FunctionInfo,
+    params: IRElement | None,
+    main_func: ExtractedAPIFunction | None,
+    main_docstring: DocString,
+):
+    """Checks a service's descriptions, parameters, copyright and subpackage for consistency.
 
-        if main_func is not None:
-            # checking function descriptions
-            if main_func.docstring.description != info.description or main_docstring.description != info.description:
-                warn(
-                    "non-matching API function descriptions",
-                    f"func docstring:      {main_func.docstring.description}",
-                    f"class docstring:     {main_docstring.description}",
-                    f"service description: {info.description}",
-                )
+    :param FunctionInfo info: The service to check.
+    :param IRElement | None params: The parsed parameters of the service.
+    :param ExtractedAPIFunction | None main_func: The main function of the service, if found.
+    :param DocString main_docstring: The docstring of the service class.
+    """
+    if main_func is not None:
+        # checking function descriptions
+        if main_func.docstring.description != info.description or main_docstring.description != info.description:
+            warn(
+                "non-matching API function descriptions",
+                f"func docstring:      {main_func.docstring.description}",
+                f"class docstring:     {main_docstring.description}",
+                f"service description: {info.description}",
+                line=main_func.line,
+            )
 
-            # checking parameters
-            all_param_names = set()
-            params_moodleset: dict[str, tuple[str, bool]] = {}
-            if isinstance(params, IRObject):
-                for name, param in params.fields.items():
-                    if isinstance(param, IRValue):
-                        params_moodleset[name] = param.type, param.nullable
-                        all_param_names.add(name)
-                    else:
-                        warn("parameters' IRObject contains non-IRValue", param, params)
-            elif params is not None:
-                warn("parameters function does not return IRObject", params)
-
-            params_docstringset: dict[str, tuple[str, bool]] = {}
-            for name, docpair in main_func.docstring.params.items():
-                name = name[1:] # removing dollar sign
-                params_docstringset[name] = convert_php_type_to_normal_type(docpair.typ)
-                all_param_names.add(name)
-
-            params_phpset: dict[str, tuple[str, bool]] = {}
-            for name, typ in main_func.params.items():
-                params_phpset[name] = convert_php_type_to_normal_type(typ)
-
-            for name in all_param_names:
-                if not (
-                        name in params_moodleset.keys()
-                    and name in params_docstringset.keys()
-                    and name in params_phpset.keys()
-                ):
-                    warn(
-                        "API call parameter not found in all parameter lists",
-                        f"moodle: {params_moodleset}",
-                        f"docstring: {params_docstringset}",
-                        f"php: {params_phpset}",
-                    )
-                elif not (params_moodleset[name] == params_docstringset[name] == params_phpset[name]):
-                    warn(
-                        "API call parameter not the same type in all parameter lists",
-                        name,
-                        f"moodle:    {params_moodleset[name]}",
-                        f"docstring: {params_docstringset[name]}",
-                        f"php:       {params_phpset[name]}",
-                    )
-
-        # checking copyright
-        if main_docstring.copyright is None:
-            warn("missing copyright notice")
-        else:
-            with Popen(["git", "log", "-1", '--pretty=format:%as', info.path], stdout=PIPE) as p:
-                lastmodificationyear = int(p.communicate()[0].decode('utf-8').split('-')[0])
-            if main_docstring.copyright[0] != lastmodificationyear:
+        # checking parameters
+        all_param_names = set()
+        params_moodleset: dict[str, tuple[str, bool]] = {}
+        if isinstance(params, IRObject):
+            for name, param in params.fields.items():
+                if isinstance(param, IRValue):
+                    params_moodleset[name] = param.type, param.nullable
+                    all_param_names.add(name)
+                else:
+                    warn("parameters' IRObject contains non-IRValue", param, params)
+        elif params is not None:
+            warn("parameters function does not return IRObject", params)
+
+        params_docstringset: dict[str, tuple[str, bool]] = {}
+        for name, docpair in main_func.docstring.params.items():
+            name = name[1:] # removing dollar sign
+            params_docstringset[name] = convert_php_type_to_normal_type(docpair.typ)
+            all_param_names.add(name)
+
+        params_phpset: dict[str, tuple[str, bool]] = {}
+        for name, typ in main_func.params.items():
+            params_phpset[name] = convert_php_type_to_normal_type(typ)
+
+        for name in all_param_names:
+            if not (
+                    name in params_moodleset.keys()
+                and name in params_docstringset.keys()
+                and name in params_phpset.keys()
+            ):
                 warn(
-                    "incorrect copyright year",
-                    f"expected: {lastmodificationyear}",
-                    f"got:      {main_docstring.copyright[0]}"
+                    "API call parameter not found in all parameter lists",
+                    f"moodle: {params_moodleset}",
+                    f"docstring: {params_docstringset}",
+                    f"php: {params_phpset}",
+                    line=main_func.line,
                 )
-            if main_docstring.copyright[1] != "Pallasys":
+            elif not (params_moodleset[name] == params_docstringset[name] == params_phpset[name]):
                 warn(
-                    "incorrect copyright name",
-                    "expected: Pallasys",
-                    f"got:      {main_docstring.copyright[1]}"
+                    "API call parameter not the same type in all parameter lists",
+                    name,
+                    f"moodle:    {params_moodleset[name]}",
+                    f"docstring: {params_docstringset[name]}",
+                    f"php:       {params_phpset[name]}",
+                    line=main_func.line,
                 )
 
-        # checking subpackage
-        expected_subpackage = 'services_' + path.basename(path.dirname(info.path))
-        if expected_subpackage != main_docstring.subpackage:
+    # checking copyright
+    if main_docstring.copyright is None:
+        warn("missing copyright notice")
+    else:
+        with timer("git"):
+            lastmodificationyear = GIT.last_modified(info.path).year
+        if main_docstring.copyright[0] != lastmodificationyear:
+            warn(
+                "incorrect copyright year",
+                f"expected: {lastmodificationyear}",
+                f"got:      {main_docstring.copyright[0]}",
+                line=main_docstring.lines.get('@copyright'),
+            )
+        if main_docstring.copyright[1] != "Pallasys":
             warn(
-                "incorrect subpackage",
-                f"expected: {expected_subpackage}",
-                f"got:      {main_docstring.subpackage}"
+                "incorrect copyright name",
+                "expected: Pallasys",
+                f"got:      {main_docstring.copyright[1]}",
+                line=main_docstring.lines.get('@copyright'),
             )
 
-    CURRENT_SERVICE = None
+    # checking subpackage
+    expected_subpackage = 'services_' + path.basename(path.dirname(info.path))
+    if expected_subpackage != main_docstring.subpackage:
+        warn(
+            "incorrect subpackage",
+            f"expected: {expected_subpackage}",
+            f"got:      {main_docstring.subpackage}",
+            line=main_docstring.lines.get('@subpackage'),
+        )
+
+class ServiceResult:
+    """Everything processing a single service produced: its extended info, diagnostics and dependencies."""
+    __slots__ = ('info', 'diagnostics', 'dependencies')
+    info: FunctionInfoEx | None
+    diagnostics: list[Diagnostic]
+    dependencies: list[str]
+
+    def __init__(self, info: FunctionInfoEx | None, diagnostics: list[Diagnostic], dependencies: list[str]):
+        self.info = info
+        self.diagnostics = diagnostics
+        self.dependencies = dependencies
+
+    def replay(self, printing: bool = True):
+        """Emits the captured diagnostics.
+
+        :param bool printing: Whether to print the diagnostics, or only collect them.
+        """
+        for diag in self.diagnostics:
+            DIAGNOSTICS.emit(diag, render=printing)
+
+    def render(self):
+        """Prints the captured diagnostics without collecting them."""
+        if DIAGNOSTICS.format == "terminal":
+            for diag in self.diagnostics:
+                DIAGNOSTICS.render(diag)
+
+class ServiceCache:
+    """On-disk cache of processed services, so that warm runs only re-process services whose sources changed.
+
+    An entry is only valid if the tool itself, the verbosity, the service's entry in services.php, the git date of the
+    service file and the contents of every file the service pulled in are all unchanged.
+    """
+    __slots__ = ('root', 'version', 'hits', 'misses')
+    root: str
+    version: str
+    hits: int
+    misses: int
+
+    def __init__(self, root: str):
+        self.root = root
+        with open(__file__, "rb") as f:
+            self.version = hashlib.sha256(f.read()).hexdigest()
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_path(self, info: FunctionInfo) -> str:
+        return path.join(self.root, f"{info.group}_{info.name}.pickle")
+
+    def _key(self, info: FunctionInfo) -> tuple[str, bool, dict[str, Any], str]:
+        # verbose runs capture the stack of every diagnostic, which must not leak into non-verbose runs and vice versa
+        return self.version, DIAGNOSTICS.verbose, info.__dict__, GIT.last_modified(info.path).isoformat()
+
+    def load(self, info: FunctionInfo) -> ServiceResult | None:
+        """Returns the cached result of a service, or None if there is none or it's outdated.
+
+        :param FunctionInfo info: The service to look up.
+        """
+        try:
+            with open(self._entry_path(info), "rb") as f:
+                key, digests, result = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, AttributeError):
+            self.misses += 1
+            return None
+
+        if key != self._key(info) or any(SOURCES.digest(fp) != digest for fp, digest in digests.items()):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return result
+
+    def store(self, info: FunctionInfo, result: ServiceResult):
+        """Saves the result of a service, together with the hashes of everything it depends on.
+
+        :param FunctionInfo info: The service the result belongs to.
+        :param ServiceResult result: The result to save.
+        """
+        digests = {fp: SOURCES.digest(fp) for fp in result.dependencies}
+        makedirs(self.root, exist_ok=True)
+        fp = self._entry_path(info)
+        with open(fp + ".tmp", "wb") as f:
+            pickle.dump((self._key(info), digests, result), f, pickle.HIGHEST_PROTOCOL)
+        replace(fp + ".tmp", fp)
+
+def run_captured(func: Callable[..., T], *args: Any) -> tuple[T, list[Diagnostic], Recording]:
+    """Runs a function while capturing its diagnostics instead of emitting them.
+
+    :param Callable func: The function to run.
+    :param Any *args: The arguments to pass to the function.
+    :returns: The return value, the captured diagnostics, and the recorded dependencies.
+    """
+    with DIAGNOSTICS.capture() as diagnostics, Recording() as recording:
+        result = func(*args)
+    return result, diagnostics, recording
 
-    data = json.dumps(complete_info, default=lambda x: x.__dict__)
+def process_service_captured(info: FunctionInfo) -> ServiceResult:
+    """Runs :func:`process_service` while capturing its diagnostics instead of printing them.
 
-    if sys.argv[1] == "-":
-        print(data)
-    elif sys.argv[1] == "/dev/null":
-        pass
+    Used for worker processes and cached runs, whose output has to be replayed later in services.php order.
+
+    :param FunctionInfo info: The service to process.
+    """
+    result, diagnostics, recording = run_captured(process_service, info)
+    return ServiceResult(result, diagnostics, sorted(recording.dependencies))
+
+def process_services(infos: list[FunctionInfo], jobs: int, cache: ServiceCache | None = None) -> list[FunctionInfoEx]:
+    """Processes all services, optionally fanned out over a pool of worker processes and backed by an on-disk cache.
+
+    The results and diagnostics are identical to a sequential, uncached run, regardless of the amount of jobs.
+
+    :param list[FunctionInfo] infos: The services to process.
+    :param int jobs: The maximum amount of worker processes to use.
+    :param ServiceCache | None cache: The cache to load results from and store them in.
+    """
+    complete_info: list[FunctionInfoEx] = []
+
+    if cache is None and jobs <= 1:
+        for info in infos:
+            result = process_service(info)
+            if result is not None:
+                complete_info.append(result)
+        return complete_info
+
+    for result in collect_service_results(infos, jobs, cache):
+        result.replay()
+        if result.info is not None:
+            complete_info.append(result.info)
+
+    return complete_info
+
+def collect_service_results(infos: list[FunctionInfo], jobs: int, cache: ServiceCache | None) -> list[ServiceResult]:
+    """Processes all services with captured diagnostics, loading from and storing to the cache if one is given.
+
+    :param list[FunctionInfo] infos: The services to process.
+    :param int jobs: The maximum amount of worker processes to use.
+    :param ServiceCache | None cache: The cache to load results from and store them in.
+    :returns: The results, in the same order as the services.
+    """
+    results: list[ServiceResult | None] = [None] * len(infos)
+    pending: list[int] = []
+    for idx, info in enumerate(infos):
+        if cache is not None:
+            results[idx] = cache.load(info)
+        if results[idx] is None:
+            pending.append(idx)
+
+    pending_infos = [infos[idx] for idx in pending]
+    if jobs <= 1 or len(pending) <= 1:
+        fresh = map(process_service_captured, pending_infos)
+        for idx, result in zip(pending, fresh):
+            results[idx] = result
     else:
-        declaration = f"const funcs = {data}"
-
-        script: str
-        with open(f"{sys.argv[1]}/script.js", "r") as f:
-            script = f.read()
-            lines = script.splitlines()
-            for i in range(len(lines)):
-                if lines[i].startswith('const funcs = '):
-                    lines[i] = declaration
-            script = "\n".join(lines)
-
-        with open(f"{sys.argv[1]}/script.js", "w") as f:
-            f.write(script)
-
-    if len(WARNCOUNT) > 0:
-        total_warns = sum(count for count in WARNCOUNT.values())
-        print(f"printed \033[33m{total_warns}\033[0m warnings in total (\033[33m{total_warns / len(infos):.2f}\033[0m per \033[36mservice\033[0m)", file=sys.stderr)
-        for msg, count in WARNCOUNT.items():
-            print(f"\033[33m{count:02d}\033[0mx \033[31m{msg}\033[0m")
+        chunksize = max(1, len(pending) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            fresh = executor.map(process_service_captured, pending_infos, chunksize=chunksize)
+            for idx, result in zip(pending, fresh):
+                results[idx] = result
+
+    if cache is not None:
+        for idx in pending:
+            cache.store(infos[idx], results[idx])
+
+    return results # type: ignore[return-value] # every slot has been filled by now
+
+def snapshot_tree(root: str) -> dict[str, tuple[int, int]]:
+    """Returns the mtime and size of every file below a directory, keyed by path.
+
+    :param str root: The directory to snapshot.
+    """
+    snapshot = {}
+    for dirpath, _, filenames in walk(root):
+        for filename in filenames:
+            fp = path.normpath(path.join(dirpath, filename))
+            try:
+                st = stat(fp)
+            except FileNotFoundError:
+                continue # deleted while we were walking
+            snapshot[fp] = (st.st_mtime_ns, st.st_size)
+    return snapshot
+
+class Watcher:
+    """Keeps the parsed project resident and regenerates the output whenever files change.
+
+    Only services depending on a changed file get re-processed; everything else is served from memory.
+    """
+    __slots__ = ('root', 'outdir', 'inline', 'infos', 'infos_result', 'results', 'failed', 'snapshot')
+    root: str
+    outdir: str
+    inline: bool
+    infos: list[FunctionInfo]
+    infos_result: ServiceResult
+    results: dict[tuple[str, str], ServiceResult]
+    failed: set[tuple[str, str]]
+    snapshot: dict[str, tuple[int, int]]
+
+    def __init__(self, root: str, outdir: str, inline: bool):
+        self.root = root
+        self.outdir = outdir
+        self.inline = inline
+        self.infos = []
+        self.results = {}
+        self.failed = set()
+        self.snapshot = {}
+
+    def _load_infos(self):
+        services_php = path.join(self.root, "db", "services.php")
+        with attribute(None, services_php):
+            infos, diagnostics, recording = run_captured(lambda: extract_function_info(SOURCES.read(services_php)))
+        self.infos = infos
+        self.infos_result = ServiceResult(None, diagnostics, sorted(recording.dependencies))
+        self.infos_result.render()
+
+    def build(self, jobs: int):
+        """Processes all services from scratch and writes the output.
+
+        :param int jobs: The maximum amount of worker processes to use.
+        """
+        self.snapshot = snapshot_tree(self.root)
+        self._load_infos()
+        results = collect_service_results(self.infos, jobs, None)
+        self.results = {(info.group, info.name): result for info, result in zip(self.infos, results)}
+        for result in results:
+            result.render()
+        self._publish()
+
+    def rebuild(self, changed: set[str], added_or_removed: set[str]) -> int:
+        """Re-processes every service affected by the given files and writes the output.
+
+        :param set[str] changed: Paths of all added, removed or modified files.
+        :param set[str] added_or_removed: Paths of all added or removed files.
+        :returns: The amount of re-processed services.
+        """
+        MEMBERS.invalidate(changed)
+        if any(fp.startswith(path.normpath(ENUMS.root) + path.sep) for fp in changed):
+            ENUMS.reset()
+        if any(fp.startswith(path.normpath(SYMBOLS.root) + path.sep) for fp in changed):
+            SYMBOLS.reset()
+        GIT.invalidate(changed)
+
+        services_root = path.join(self.root, "services") + path.sep
+        old_infos = {(info.group, info.name): info.__dict__ for info in self.infos}
+        if not changed.isdisjoint(self.infos_result.dependencies) \
+                or any(fp.startswith(services_root) for fp in added_or_removed):
+            self._load_infos()
+
+        count = 0
+        for info in self.infos:
+            key = (info.group, info.name)
+            old = self.results.get(key)
+            if (
+                old is None
+                or key in self.failed
+                or old_infos.get(key) != info.__dict__
+                or not changed.isdisjoint(old.dependencies)
+            ):
+                count += 1
+                try:
+                    self.results[key] = process_service_captured(info)
+                    self.failed.discard(key)
+                except Exception:
+                    tb.print_exc()
+                    print(f"failed to process service \033[36m{info.name}\033[0m, keeping its last result", file=sys.stderr)
+                    self.failed.add(key)
+                    continue
+                self.results[key].render()
+
+        current = {(info.group, info.name) for info in self.infos}
+        for key in [key for key in self.results.keys() if key not in current]:
+            del self.results[key]
+
+        self._publish()
+        return count
+
+    def _publish(self):
+        DIAGNOSTICS.reset()
+        self.infos_result.replay(printing=False)
+        complete_info = []
+        for info in self.infos:
+            result = self.results.get((info.group, info.name))
+            if result is None:
+                continue
+            result.replay(printing=False)
+            if result.info is not None:
+                complete_info.append(result.info)
+
+        write_output(self.outdir, complete_info, self.inline)
+        report_warnings(len(self.infos), None)
+
+    def run(self, interval: float):
+        """Polls the project for changes until interrupted.
+
+        :param float interval: Seconds to wait between polls.
+        """
+        while True:
+            sleep(interval)
+            snapshot = snapshot_tree(self.root)
+            if snapshot == self.snapshot:
+                continue
+
+            added_or_removed = snapshot.keys() ^ self.snapshot.keys()
+            changed = {fp for fp in snapshot.keys() | self.snapshot.keys() if snapshot.get(fp) != self.snapshot.get(fp)}
+            self.snapshot = snapshot
+
+            start = perf_counter()
+            count = self.rebuild(changed, added_or_removed)
+            print(
+                f"rebuilt \033[33m{count}\033[0m services in \033[33m{(perf_counter() - start) * 1000:.1f}\033[0mms "
+                f"after changes to {', '.join(sorted(changed))}",
+                file=sys.stderr,
+            )
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Extracts and checks the API documentation of all web services.")
+    parser.add_argument(
+        "outdir",
+        help="docs folder to write funcs.json and funcs.js to, or '-' to print the data to stdout, or /dev/null to only run checks",
+    )
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="amount of worker processes to extract services with")
+    parser.add_argument(
+        "--cache",
+        nargs="?",
+        const=".cache/document_services",
+        metavar="DIR",
+        help="reuse the results of services whose sources didn't change since the last run (default: %(const)s)",
+    )
+    parser.add_argument(
+        "--inline-definitions",
+        action="store_true",
+        help="write IR objects in full wherever they occur instead of once in a definitions table, i.e. the old output shape",
+    )
+    parser.add_argument("--watch", action="store_true", help="keep running and regenerate the output whenever files change")
+    parser.add_argument("--interval", type=float, default=0.25, help="seconds between polls in watch mode (default: %(default)s)")
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="write per-phase and per-service timings as JSON to FILE, or '-' for stderr",
+    )
+    parser.add_argument("--profile-memory", action="store_true", help="include tracemalloc peaks in the profile")
+    parser.add_argument("--profile-cprofile", metavar="FILE", help="also run cProfile and dump its stats to FILE")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show the call stack that led to each warning")
+    parser.add_argument(
+        "--diagnostics-format",
+        choices=["terminal", "json", "sarif"],
+        default="terminal",
+        help="how to report warnings (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--diagnostics-file",
+        metavar="FILE",
+        help="write json or sarif diagnostics to FILE instead of stderr",
+    )
+    parser.add_argument(
+        "--budget",
+        action="append",
+        default=[],
+        metavar="CODE=N",
+        help="allow up to N warnings with the given code (or '*' for all codes) before failing, can be repeated",
+    )
+    parser.add_argument(
+        "--diff",
+        metavar="OLD",
+        help="compare the API against a previous funcs.json, funcs.js or '-' output and report the differences as JSON",
+    )
+    parser.add_argument("--diff-output", metavar="FILE", default="-", help="where to write the diff (default: stdout)")
+    parser.add_argument(
+        "--validate",
+        metavar="JSONL",
+        help="check recorded {wsfunction, params, response} calls from a JSONL file (or '-' for stdin) against the API",
+    )
+    parser.add_argument("--validate-output", metavar="FILE", default="-", help="where to write the validation report (default: stdout)")
+    parser.add_argument(
+        "--audit-payloads",
+        metavar="FILE",
+        help="write estimated response sizes and arrays without a limiting parameter as JSON to FILE, or '-' for stdout",
+    )
+    parser.add_argument(
+        "--audit-array-items",
+        type=int,
+        default=100,
+        metavar="N",
+        help="items per array to assume for the worst-case response size (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--audit-queries",
+        metavar="FILE",
+        help="write database queries that run once per loop iteration, per endpoint, as JSON to FILE, or '-' for stdout",
+    )
+    parser.add_argument(
+        "--call-graph",
+        metavar="FILE",
+        help="write the call graph and estimated database round trips per endpoint as JSON to FILE, or '-' for stdout",
+    )
+    parser.add_argument("--call-graph-dot", metavar="FILE", help="write the call graph in graphviz format to FILE, or '-' for stdout")
+    parser.add_argument(
+        "--loop-weight",
+        type=float,
+        default=10,
+        help="how many iterations to assume per loop when estimating round trips (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--audit-indexes",
+        metavar="FILE",
+        help="write lookups install.xml has no index for and whole-table reads as JSON to FILE, or '-' for stdout",
+    )
+    args = parser.parse_args()
+
+    # only one thing can be written to stdout, otherwise the outputs get interleaved and none of them can be parsed
+    stdout_outputs = {
+        "outdir": args.outdir,
+        "--diff-output": args.diff_output if args.diff is not None else None,
+        "--validate-output": args.validate_output if args.validate is not None else None,
+        "--audit-payloads": args.audit_payloads,
+        "--audit-queries": args.audit_queries,
+        "--call-graph": args.call_graph,
+        "--call-graph-dot": args.call_graph_dot,
+        "--audit-indexes": args.audit_indexes,
+    }
+    on_stdout = [option for option, fp in stdout_outputs.items() if fp == "-"]
+    if len(on_stdout) > 1:
+        parser.error(f"{', '.join(on_stdout)} would all be written to stdout, name a file for all but one of them")
+
+    if args.watch:
+        # watch mode only regenerates the output, everything else would be silently ignored
+        unsupported = {
+            "--cache": args.cache,
+            "--profile": args.profile,
+            "--diagnostics-file": args.diagnostics_file,
+            "--budget": args.budget or None,
+            "--diff": args.diff,
+            "--validate": args.validate,
+            "--audit-payloads": args.audit_payloads,
+            "--audit-queries": args.audit_queries,
+            "--call-graph": args.call_graph,
+            "--call-graph-dot": args.call_graph_dot,
+            "--audit-indexes": args.audit_indexes,
+        }
+        given = [option for option, value in unsupported.items() if value is not None]
+        if len(given) > 0:
+            parser.error(f"{', '.join(given)} can't be combined with --watch")
+
+    DIAGNOSTICS.verbose = args.verbose
+    DIAGNOSTICS.format = args.diagnostics_format
+    for budget in args.budget:
+        code, sep, amount = budget.rpartition("=")
+        if sep == "" or not amount.isdigit():
+            parser.error(f"invalid budget {budget!r}, expected CODE=N")
+        if code == "*":
+            DIAGNOSTICS.default_budget = int(amount)
+        else:
+            DIAGNOSTICS.budgets[code] = int(amount)
+
+    if args.watch:
+        watcher = Watcher("lbplanner", args.outdir, args.inline_definitions)
+        watcher.build(args.jobs)
+        try:
+            watcher.run(args.interval)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    global PROFILER
+    profile: cProfile.Profile | None = None
+    if args.profile is not None:
+        PROFILER = Profiler(args.profile_memory)
+        if args.jobs > 1:
+            print("profiling runs all services in this process, ignoring --jobs", file=sys.stderr)
+            args.jobs = 1
+        if args.profile_cprofile is not None:
+            profile = cProfile.Profile()
+            profile.enable()
+    start = perf_counter()
+
+    with timer("read_services_php"):
+        content = SOURCES.read("lbplanner/db/services.php")
+
+    with timer("extract_function_info"), attribute(None, "lbplanner/db/services.php"):
+        infos = extract_function_info(content)
+
+    cache = None if args.cache is None else ServiceCache(args.cache)
+    with timer("process_services"):
+        complete_info = process_services(infos, args.jobs, cache)
+
+    write_output(args.outdir, complete_info, args.inline_definitions)
+
+    if args.diff is not None:
+        write_api_diff(args.diff, complete_info, args.diff_output, args.inline_definitions)
+
+    if args.audit_payloads is not None:
+        write_payload_audit(args.audit_payloads, complete_info, args.audit_array_items)
+
+    if args.audit_queries is not None:
+        write_query_audit(args.audit_queries, infos)
+
+    if args.call_graph is not None or args.call_graph_dot is not None:
+        write_call_graph(infos, args.cache, args.loop_weight, args.call_graph, args.call_graph_dot)
+
+    if args.audit_indexes is not None:
+        write_index_audit(args.audit_indexes, infos, args.cache)
+
+    if args.validate is not None:
+        with timer("validate"):
+            run_validation(args.validate, complete_info, args.jobs, args.validate_output)
+
+    if PROFILER is not None:
+        write_profile(args.profile, PROFILER, perf_counter() - start, profile, args.profile_cprofile)
+
+    if report_warnings(len(infos), args.diagnostics_file):
         sys.exit(1)
 
+def write_profile(
+    fp: str,
+    profiler: Profiler,
+    total: float,
+    profile: 'cProfile.Profile | None',
+    profile_fp: str | None,
+):
+    """Writes the profiling report of a run.
+
+    :param str fp: The file to write the report to, or '-' for stderr.
+    :param Profiler profiler: The profiler that collected the timings.
+    :param float total: The total runtime, in seconds.
+    :param cProfile.Profile | None profile: The cProfile profiler, if it was enabled.
+    :param str | None profile_fp: Where to dump the cProfile stats to.
+    """
+    report = profiler.report()
+    report["total_seconds"] = total
+
+    if profile is not None and profile_fp is not None:
+        profile.disable()
+        profile.dump_stats(profile_fp)
+        stats = pstats.Stats(profile).stats # type: ignore[attr-defined] # undocumented, but stable
+        ranked = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)
+        report["cprofile"] = [
+            {
+                "function": f"{path.relpath(filename) if filename.startswith('/') else filename}:{line}({name})",
+                "calls": calls,
+                "tottime": tottime,
+                "cumtime": cumtime,
+            }
+            for (filename, line, name), (_, calls, tottime, cumtime, _) in ranked[:25]
+        ]
+
+    data = json.dumps(report, indent=4)
+    if fp == "-":
+        print(data, file=sys.stderr)
+    else:
+        with open(fp, "w") as f:
+            f.write(data + "\n")
+
+def write_if_changed(fp: str, content: str, marker: str) -> bool:
+    """Atomically replaces a file with new content, unless the file already starts with the given marker.
+
+    :param str fp: The path of the file to write.
+    :param str content: The new content. Must start with the marker.
+    :param str marker: A prefix identifying the content, e.g. containing a hash of it.
+    :returns: Whether the file was written.
+    """
+    assert content.startswith(marker)
+    try:
+        with open(fp, "r") as f:
+            if f.read(len(marker)) == marker:
+                return False
+    except FileNotFoundError:
+        pass
+
+    tmp = f"{fp}.tmp"
+    with open(tmp, "w") as f:
+        f.write(content)
+    replace(tmp, fp)
+    return True
+
+def build_manifest(complete_info: list[FunctionInfoEx]) -> dict[str, Any]:
+    """Precomputes the lookups clients need for caching and batching, so they don't have to scan all services.
+
+    :param list[FunctionInfoEx] complete_info: The services to index.
+    :returns: Per-endpoint metadata, and the endpoints by capability, by group, and by whether they're read-only.
+    """
+    endpoints: dict[str, dict[str, Any]] = {}
+    capabilities: dict[str, list[str]] = {}
+    groups: dict[str, list[str]] = {}
+    read_only: list[str] = []
+    ajax: list[str] = []
+
+    for info in sorted(complete_info, key=lambda info: (info.group, info.name)):
+        wsfunction = f"local_lbplanner_{info.group}_{info.name}"
+        endpoints[wsfunction] = {
+            "group": info.group,
+            "type": info.type,
+            "ajax": info.ajax,
+            "capabilities": info.capabilities,
+        }
+        for capability in info.capabilities:
+            capabilities.setdefault(capability, []).append(wsfunction)
+        groups.setdefault(info.group, []).append(wsfunction)
+        if info.type == "read":
+            read_only.append(wsfunction)
+        if info.ajax:
+            ajax.append(wsfunction)
+
+    return {
+        "endpoints": endpoints,
+        "capabilities": dict(sorted(capabilities.items())),
+        "groups": groups,
+        "read_only": read_only,
+        "ajax": ajax,
+    }
+
+class IRDefinitions:
+    """The IR objects that occur in more than one place of the output, e.g. a model structure returned by several services.
+
+    Each of them gets written once into a ``definitions`` table, keyed by a hash of its contents so that ids stay
+    stable across runs, and every occurrence refers to it as ``{"$ref": id}``.
+    """
+    __slots__ = ('nodes', 'refs')
+    nodes: dict[str, IRObject]
+    refs: dict[int, str]
+
+    def __init__(self, complete_info: list[FunctionInfoEx]):
+        # how often each node is referenced; nodes are shared, so the children of a shared node only count once
+        references: dict[int, int] = {}
+        order: list[IRElement] = []
+
+        def visit(element: IRElement):
+            count = references.get(id(element), 0)
+            references[id(element)] = count + 1
+            if count > 0:
+                return
+            order.append(element)
+            if isinstance(element, IRObject):
+                for field in element.fields.values():
+                    visit(field)
+            elif isinstance(element, IRArray):
+                visit(element.value)
+
+        for info in complete_info:
+            for element in (info.parameters, info.returns):
+                if element is not None:
+                    visit(element)
+
+        self.nodes = {}
+        self.refs = {}
+        for element in order:
+            if isinstance(element, IRObject) and references[id(element)] > 1:
+                ref = hashlib.blake2b(dump_json(element, sort_keys=True).encode('utf-8'), digest_size=8).hexdigest()
+                self.nodes[ref] = element
+                self.refs[id(element)] = ref
+
+    def dump(self, sort_keys: bool = False) -> str:
+        """Serializes the table as a JSON object from id to definition."""
+        if len(self.nodes) == 0:
+            return '{}'
+        return "{" + ", ".join(
+            f"{encode_json_string(ref)}: {dump_json(node, sort_keys, self.refs)}" for ref, node in self.nodes.items()
+        ) + "}"
+
+def serialize_services(complete_info: list[FunctionInfoEx], sort_keys: bool, inline: bool) -> tuple[str | None, str]:
+    """Serializes the services, writing IR objects that occur in more than one place only once.
+
+    :param list[FunctionInfoEx] complete_info: The services to serialize.
+    :param bool sort_keys: Whether to sort the attributes of the services and IR nodes by name.
+    :param bool inline: Whether to write every IR object in full wherever it occurs, without a definitions table.
+    :returns: The definitions as a JSON object (None if inlined), and the services as a JSON array.
+    """
+    if inline:
+        return None, dump_json(complete_info, sort_keys)
+    definitions = IRDefinitions(complete_info)
+    return definitions.dump(sort_keys), dump_json(complete_info, sort_keys, definitions.refs)
+
+def content_hash(definitions: str | None, data: str) -> str:
+    """Returns the hash of serialized services, see :func:`serialize_services`."""
+    if definitions is not None:
+        data = f"{definitions}\n{data}"
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+def inline_definitions(value: Any, definitions: dict[str, Any], resolved: dict[str, Any] | None = None) -> Any:
+    """Replaces every ``{"$ref": id}`` in deserialized services with its definition.
+
+    Every definition is resolved only once, so all of its occurrences share the same object.
+
+    :param Any value: The deserialized services, or a part of them.
+    :param dict[str, Any] definitions: The deserialized definitions table.
+    :param dict[str, Any] | None resolved: Already resolved definitions by id.
+    """
+    if resolved is None:
+        resolved = {}
+    if type(value) is dict:
+        ref = value.get("$ref")
+        if ref is not None and len(value) == 1:
+            node = resolved.get(ref)
+            if node is None:
+                node = resolved[ref] = inline_definitions(definitions[ref], definitions, resolved)
+            return node
+        return {k: inline_definitions(v, definitions, resolved) for k, v in value.items()}
+    elif type(value) is list:
+        return [inline_definitions(v, definitions, resolved) for v in value]
+    return value
+
+def write_output(outdir: str, complete_info: list[FunctionInfoEx], inline: bool = False):
+    """Serializes the extracted services and writes them wherever the user asked for.
+
+    IR objects that occur in more than one place are written once into a ``definitions`` table and referred to by
+    id, see :class:`IRDefinitions`; with ``inline``, the output has the old shape without references instead.
+
+    In a docs folder, the data gets written to funcs.json and funcs.js together with the manifest from
+    :func:`build_manifest`, each carrying a hash of the data, and files whose hash already matches are left
+    untouched. A ``const funcs`` line in a legacy script.js gets updated as well, always with inlined data.
+
+    :param str outdir: docs folder, or '-' for stdout, or /dev/null for nowhere.
+    :param list[FunctionInfoEx] complete_info: The services to write.
+    :param bool inline: Whether to inline all IR objects instead of writing a definitions table.
+    """
+    if outdir == "-" or outdir == "/dev/null":
+        with timer("serialization"):
+            definitions, data = serialize_services(complete_info, False, inline)
+            if definitions is not None:
+                data = f'{{"definitions": {definitions}, "funcs": {data}}}'
+        if outdir == "-":
+            print(data)
+        return
+
+    with timer("serialization"):
+        definitions, data = serialize_services(complete_info, True, inline)
+        digest = content_hash(definitions, data)
+        manifest = dump_json(build_manifest(complete_info))
+
+    marker = f'{{"hash": "{digest}", '
+    shared = "" if definitions is None else f'"definitions": {definitions}, '
+    write_if_changed(path.join(outdir, "funcs.json"), f'{marker}"manifest": {manifest}, {shared}"funcs": {data}}}\n', marker)
+
+    marker = f"// content-hash: {digest}\n"
+    shared = "" if definitions is None else f"const definitions = {definitions};\n"
+    write_if_changed(path.join(outdir, "funcs.js"), f"{marker}const manifest = {manifest};\n{shared}const funcs = {data};\n", marker)
+
+    scriptpath = path.join(outdir, "script.js")
+    if not path.exists(scriptpath):
+        return
+
+    if definitions is not None:
+        with timer("serialization"):
+            data = dump_json(complete_info, sort_keys=True)
+    declaration = f"const funcs = {data}"
+    with open(scriptpath, "r") as f:
+        lines = f.read().splitlines()
+    changed = False
+    for i in range(len(lines)):
+        if lines[i].startswith('const funcs = ') and lines[i] != declaration:
+            lines[i] = declaration
+            changed = True
+
+    if changed:
+        with open(f"{scriptpath}.tmp", "w") as f:
+            f.write("\n".join(lines))
+        replace(f"{scriptpath}.tmp", scriptpath)
+
+def load_api_surface(fp: str) -> tuple[str | None, list[dict[str, Any]]]:
+    """Loads the services from a previous output: funcs.json, funcs.js, or what '-' printed.
+
+    :param str fp: The file to load.
+    :returns: The content hash the file was written with (if any), and the services with all definitions inlined.
+    """
+    with open(fp, "r") as f:
+        content = f.read()
+
+    if content.lstrip().startswith(('[', '{')):
+        data = json.loads(content)
+        if not isinstance(data, dict):
+            return None, data
+    else:
+        # funcs.js or a legacy script.js: only the const definitions and funcs declarations are of interest
+        data = {}
+        for line in content.splitlines():
+            for name in ("definitions", "funcs"):
+                prefix = f"const {name} = "
+                if line.startswith(prefix):
+                    data[name] = json.loads(line[len(prefix):].rstrip().removesuffix(';'))
+        if "funcs" not in data:
+            raise ValueError(f"{fp} contains no const funcs declaration")
+
+    funcs = data["funcs"]
+    if "definitions" in data:
+        funcs = inline_definitions(funcs, data["definitions"])
+    return data.get("hash"), funcs
+
+def subtree_hash(value: Any, memo: dict[int, str]) -> str:
+    """Returns a hash of a JSON value, computed bottom-up from the hashes of its children.
+
+    :param Any value: The value to hash.
+    :param dict[int, str] memo: Already computed hashes by object id, so that every subtree is only hashed once.
+    """
+    if type(value) is dict:
+        digest = memo.get(id(value))
+        if digest is None:
+            parts = [f"{encode_json_string(k)}:{subtree_hash(v, memo)}" for k, v in sorted(value.items())]
+            digest = hashlib.blake2b(("{" + ",".join(parts) + "}").encode('utf-8'), digest_size=16).hexdigest()
+            memo[id(value)] = digest
+        return digest
+    elif type(value) is list:
+        digest = memo.get(id(value))
+        if digest is None:
+            parts = [subtree_hash(v, memo) for v in value]
+            digest = hashlib.blake2b(("[" + ",".join(parts) + "]").encode('utf-8'), digest_size=16).hexdigest()
+            memo[id(value)] = digest
+        return digest
+    return json.dumps(value)
+
+class APIDiff:
+    """Compares two versions of the API surface, endpoint by endpoint and IR path by IR path.
+
+    Every subtree is hashed once, and subtrees with equal hashes are skipped without looking inside.
+    """
+    __slots__ = ('old_memo', 'new_memo', 'changes')
+    old_memo: dict[int, str]
+    new_memo: dict[int, str]
+    changes: list[dict[str, Any]]
+
+    IR_ATTRIBUTES = ('type', 'required', 'nullable', 'default_value', 'description')
+    ENDPOINT_ATTRIBUTES = ('description', 'capabilities', 'path', 'type', 'ajax')
+
+    def __init__(self):
+        self.old_memo = {}
+        self.new_memo = {}
+        self.changes = []
+
+    def same(self, old: Any, new: Any) -> bool:
+        return subtree_hash(old, self.old_memo) == subtree_hash(new, self.new_memo)
+
+    def compare(self, old: list[dict[str, Any]], new: list[dict[str, Any]]) -> dict[str, Any]:
+        """Compares two lists of services.
+
+        :returns: The added, removed and changed endpoints, with every change to a changed one.
+        """
+        old_by_name = {f"local_lbplanner_{func['group']}_{func['name']}": func for func in old}
+        new_by_name = {f"local_lbplanner_{func['group']}_{func['name']}": func for func in new}
+
+        changed: dict[str, list[dict[str, Any]]] = {}
+        unchanged = 0
+        for name, new_func in new_by_name.items():
+            old_func = old_by_name.get(name)
+            if old_func is None or self.same(old_func, new_func):
+                unchanged += old_func is not None
+                continue
+            self.changes = []
+            for attribute in self.ENDPOINT_ATTRIBUTES:
+                if old_func.get(attribute) != new_func.get(attribute):
+                    self.changes.append({
+                        "path": "",
+                        "change": "changed",
+                        "attribute": attribute,
+                        "old": old_func.get(attribute),
+                        "new": new_func.get(attribute),
+                    })
+            self.compare_ir("parameters", old_func.get("parameters"), new_func.get("parameters"))
+            self.compare_ir("returns", old_func.get("returns"), new_func.get("returns"))
+            changed[name] = self.changes
+
+        added = [name for name in new_by_name.keys() if name not in old_by_name]
+        removed = [name for name in old_by_name.keys() if name not in new_by_name]
+        return {
+            "summary": {"added": len(added), "removed": len(removed), "changed": len(changed), "unchanged": unchanged},
+            "added": added,
+            "removed": removed,
+            "changed": changed,
+        }
+
+    def compare_ir(self, irpath: str, old: dict[str, Any] | None, new: dict[str, Any] | None):
+        """Records every difference between two IR subtrees.
+
+        :param str irpath: The path of the subtree within the endpoint, e.g. ``returns[].fields.id``.
+        """
+        if old is None and new is None:
+            return
+        elif old is None:
+            self.changes.append({"path": irpath, "change": "added", "new": new})
+            return
+        elif new is None:
+            self.changes.append({"path": irpath, "change": "removed", "old": old})
+            return
+        elif self.same(old, new):
+            return
+
+        for attribute in self.IR_ATTRIBUTES:
+            if old.get(attribute) != new.get(attribute):
+                self.changes.append({
+                    "path": irpath,
+                    "change": "changed",
+                    "attribute": attribute,
+                    "old": old.get(attribute),
+                    "new": new.get(attribute),
+                })
+
+        if old.get("type") != new.get("type"):
+            # a different kind of element, its children aren't comparable
+            return
+
+        if "value" in old or "value" in new:
+            self.compare_ir(f"{irpath}[]", old.get("value"), new.get("value"))
+        if "fields" in old or "fields" in new:
+            old_fields = old.get("fields") or {}
+            new_fields = new.get("fields") or {}
+            for name in [*old_fields.keys(), *(k for k in new_fields.keys() if k not in old_fields)]:
+                self.compare_ir(f"{irpath}.{name}", old_fields.get(name), new_fields.get(name))
+
+def write_api_diff(old_fp: str, complete_info: list[FunctionInfoEx], fp: str, inline: bool = False):
+    """Compares the extracted services against a previous output and writes the differences as JSON.
+
+    :param str old_fp: The previous output, see :func:`load_api_surface`.
+    :param list[FunctionInfoEx] complete_info: The services extracted in this run.
+    :param str fp: The file to write the report to, or '-' for stdout.
+    :param bool inline: Whether the outputs of this run inline all IR objects, which the content hash depends on.
+    """
+    with timer("diff"):
+        old_hash, old = load_api_surface(old_fp)
+        definitions, data = serialize_services(complete_info, True, inline)
+        new_hash = content_hash(definitions, data)
+        if old_hash == new_hash:
+            result = APIDiff().compare([], [])
+            result["summary"]["unchanged"] = len(complete_info)
+        else:
+            new = json.loads(data)
+            if definitions is not None:
+                new = inline_definitions(new, json.loads(definitions))
+            result = APIDiff().compare(old, new)
+        report = json.dumps({"old_hash": old_hash, "new_hash": new_hash, **result}, indent=2)
+
+    if fp == "-":
+        print(report)
+    else:
+        with open(fp, "w") as f:
+            f.write(report + "\n")
+
+# rough sizes of encoded JSON values, assuming typical contents
+_VALUE_BYTES = {"int": 6, "bool": 5, "String": 24}
+
+_PAGINATION_PARAM = re.compile(r"(?:^|_)(?:limit|per_?page|page|page_?size|offset)(?:_|$)")
+
+class PayloadAudit:
+    """Estimates the encoded size of an endpoint's response from its IR, and finds arrays nothing limits the length of."""
+    __slots__ = ('array_items', 'bound', 'arrays')
+    array_items: int
+    bound: str | None
+    arrays: list[dict[str, Any]]
+
+    def __init__(self, array_items: int, bound: str | None):
+        """
+        :param int array_items: The amount of items to assume per array for the worst case.
+        :param str | None bound: The pagination parameter limiting the outermost arrays, if the endpoint has one.
+        """
+        self.array_items = array_items
+        self.bound = bound
+        self.arrays = []
+
+    def estimate(self, element: IRElement | None, irpath: str, in_array: bool) -> tuple[int, int]:
+        """Returns the worst-case size in bytes and the nesting depth of an IR subtree, recording every array in it."""
+        if element is None:
+            return 4, 0 # null
+        elif isinstance(element, IRObject):
+            size, depth = 2 + 2 * max(len(element.fields) - 1, 0), 0
+            for name, field in element.fields.items():
+                field_size, field_depth = self.estimate(field, f"{irpath}.{name}", in_array)
+                size += len(name) + 4 + field_size
+                depth = max(depth, field_depth)
+            return size, depth + 1
+        elif isinstance(element, IRArray):
+            entry: dict[str, Any] = {"path": irpath}
+            self.arrays.append(entry)
+            item_size, item_depth = self.estimate(element.value, f"{irpath}[]", True)
+            entry["item_fields"] = len(element.value.fields) if isinstance(element.value, IRObject) else 1
+            entry["bytes_per_item"] = item_size
+            entry["bounded_by"] = None if in_array else self.bound
+            return 2 + self.array_items * (item_size + 2), item_depth + 1
+        else:
+            assert isinstance(element, IRValue)
+            return _VALUE_BYTES.get(element.type, 8), 0
+
+def audit_payloads(complete_info: list[FunctionInfoEx], array_items: int) -> list[dict[str, Any]]:
+    """Estimates the response size of every service and flags arrays that aren't bounded by a parameter.
+
+    Only pagination-like parameters (limit, perpage, offset, …) count as bounding an array,
+    and only the outermost one, since they don't limit arrays nested in its items.
+
+    :param list[FunctionInfoEx] complete_info: The services to audit.
+    :param int array_items: The amount of items to assume per array for the worst case.
+    :returns: One entry per service, largest estimated response first.
+    """
+    report = []
+    for info in complete_info:
+        bound = None
+        if isinstance(info.parameters, IRObject):
+            for name in info.parameters.fields.keys():
+                if _PAGINATION_PARAM.search(name.lower()):
+                    bound = name
+                    break
+
+        audit = PayloadAudit(array_items, bound)
+        size, depth = audit.estimate(info.returns, "returns", False)
+        report.append({
+            "endpoint": f"local_lbplanner_{info.group}_{info.name}",
+            "estimated_bytes": size,
+            "depth": depth,
+            "unbounded_arrays": sum(1 for entry in audit.arrays if entry["bounded_by"] is None),
+            "arrays": audit.arrays,
+        })
+    report.sort(key=lambda entry: (-entry["estimated_bytes"], entry["endpoint"]))
+    return report
+
+def write_payload_audit(fp: str, complete_info: list[FunctionInfoEx], array_items: int):
+    """Writes the payload audit as JSON. See :func:`audit_payloads`.
+
+    :param str fp: The file to write the report to, or '-' for stdout.
+    """
+    with timer("payload_audit"):
+        report = json.dumps({"array_items": array_items, "endpoints": audit_payloads(complete_info, array_items)}, indent=2)
+    if fp == "-":
+        print(report)
+    else:
+        with open(fp, "w") as f:
+            f.write(report + "\n")
+
+# $DB methods that talk to the database, as opposed to e.g. get_in_or_equal() or sql_like()
+_DB_QUERY_METHOD = re.compile(r"get_(?:records?|recordset|field|fieldset)|record_exists|count_records|insert_records?|update_record|delete_records|set_field|execute")
+
+# functions that call their first argument once per element
+_LOOP_CALLBACK_FUNCTIONS = frozenset(('array_map', 'array_filter', 'array_walk', 'usort'))
+
+# helpers that are reported as a query of their own, instead of looking at the queries inside them
+_QUERY_HELPERS = frozenset(('notifications_helper::notify_user',))
+
+class PHPCallSite:
+    """A call inside a method body, with the loops around it."""
+    __slots__ = ('kind', 'name', 'target', 'line', 'loops', 'args')
+    kind: str
+    name: str
+    target: tuple[str, str, str] | None
+    line: int
+    loops: tuple[tuple[str, int], ...]
+    args: tuple[str, ...]
+
+    def __init__(
+        self,
+        kind: str,
+        name: str,
+        target: tuple[str, str, str] | None,
+        line: int,
+        loops: tuple[tuple[str, int], ...],
+        args: tuple[str, ...] = (),
+    ):
+        """
+        :param str kind: 'db' for a query through $DB, 'method' for a call into the plugin's own classes.
+        :param str name: The call as written, e.g. ``$DB->get_record`` or ``slot_helper::get_slot``.
+        :param tuple | None target: The (file, class, method) that gets called, if it's part of the plugin.
+        :param int line: The line of the call.
+        :param tuple loops: The kind and line of every loop around the call, outermost first.
+        :param tuple args: The source code of every argument, only collected for queries.
+        """
+        self.kind = kind
+        self.name = name
+        self.target = target
+        self.line = line
+        self.loops = loops
+        self.args = args
+
+class CallIndex:
+    """The calls made by every method of the plugin, each method scanned once per version of its file."""
+    __slots__ = ('entries', 'owners')
+    entries: dict[tuple[str, str, str], tuple[PHPFile, list[PHPCallSite]]]
+    owners: dict[str, list[tuple[str, str]]] | None
+
+    def __init__(self):
+        self.entries = {}
+        self.owners = None
+
+    def reset(self):
+        self.entries = {}
+        self.owners = None
+
+    def calls(self, fp: str, classname: str, methodname: str) -> list[PHPCallSite]:
+        """Returns the calls a method makes, scanning it if it changed since the last time.
+
+        :param str fp: The file declaring the class.
+        :param str classname: The class declaring the method.
+        :param str methodname: The name of the method.
+        """
+        key = (fp, classname, methodname)
+        structure = SOURCES.structure(fp, track=False)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] is structure:
+            return entry[1]
+
+        cls = structure.find_class(classname)
+        methods = cls.find_methods(methodname) if cls is not None else []
+        calls = scan_calls(structure, fp, cls, methods[0]) if cls is not None and len(methods) > 0 else []
+        self.entries[key] = (structure, calls)
+        return calls
+
+    def find_method(self, fp: str, classname: str, methodname: str) -> tuple[str, str, str] | None:
+        """Finds the class that actually declares a method, following the inheritance chain.
+
+        :returns: The file, class and method name, or None if the method isn't part of the plugin.
+        """
+        for _ in range(16): # guards against inheritance cycles
+            structure = SOURCES.structure(fp, track=False)
+            cls = structure.find_class(classname)
+            if cls is None:
+                return None
+            if len(cls.find_methods(methodname)) > 0:
+                return fp, classname, methodname
+            if cls.parent is None:
+                return None
+            parent_fp = resolve_class(structure.name_resolution(), cls.parent)
+            if parent_fp is None:
+                return None
+            fp, classname = parent_fp, cls.parent.split('\\')[-1]
+        return None
+
+    def owners_of(self, methodname: str) -> list[tuple[str, str]]:
+        """Returns the file and class of every plugin class declaring a method of this name."""
+        if self.owners is None:
+            self.owners = {}
+            for fp in SYMBOLS.load().values():
+                for cls in SOURCES.structure(fp, track=False).classes:
+                    for method in cls.methods:
+                        self.owners.setdefault(method.name, []).append((fp, cls.name))
+        return self.owners.get(methodname, [])
+
+CALLS = CallIndex()
+
+def resolve_class(nr: PHPNameResolution, name: str) -> str | None:
+    """Returns the file declaring a class of the plugin, or None for classes from elsewhere. Never warns."""
+    fqn = nr.qualify(name)
+    if fqn is None:
+        return None
+    return SYMBOLS.load().get(fqn)
+
+def scan_calls(structure: PHPFile, fp: str, cls: PHPClass, method: PHPMethod) -> list[PHPCallSite]:
+    """Finds every database query and every call into the plugin's classes in a method body, with the loops around them.
+
+    Loops are ``foreach``, ``for`` and ``while`` bodies, as well as callbacks passed to ``array_map`` and friends.
+    Loop headers don't count, since they only get evaluated once (or once per iteration, which is rare for queries).
+    Instance calls get resolved through parameter types, ``new`` assignments and ``$this``; calls on other variables
+    only get resolved if exactly one class of the plugin declares a method of that name.
+    """
+    code = structure.code
+    nr = structure.name_resolution()
+    offset = method.body_start
+    tokens = tokenize_php(code[offset:method.body_end])
+    calls: list[PHPCallSite] = []
+
+    types: dict[str, str] = {'$this': cls.name}
+    for typ, var in re.findall(r"([\w\\]+)\s+(\$\w+)", method.params):
+        types[var] = typ
+
+    def text(idx: int) -> str:
+        if idx >= len(tokens):
+            return ""
+        return code[offset + tokens[idx][1]:offset + tokens[idx][2]]
+
+    def class_file(name: str) -> tuple[str, str] | None:
+        if name in ('self', 'static'):
+            return fp, cls.name
+        if name == 'parent':
+            if cls.parent is None:
+                return None
+            name = cls.parent
+        class_fp = resolve_class(nr, name)
+        if class_fp is None:
+            return None
+        return class_fp, name.split('\\')[-1]
+
+    # (kind, line, mode, brace depth, paren depth) of every loop we're in
+    loops: list[tuple[str, int, str, int, int]] = []
+    headers: list[tuple[str, int, int]] = [] # loop headers whose closing paren we're waiting for
+    body_loop: tuple[str, int] | None = None # a loop whose body starts with the next brace
+    braces = 0
+    parens = 0
+
+    def current_loops() -> tuple[tuple[str, int], ...]:
+        return tuple((kind, line) for kind, line, _, _, _ in loops)
+
+    def arguments(open_idx: int) -> tuple[str, ...]:
+        """Returns the source of every argument of the call whose opening paren is at ``open_idx``."""
+        args = []
+        depth = 0
+        start = tokens[open_idx][2]
+        for j in range(open_idx, len(tokens)):
+            c = text(j)
+            if c in ('(', '[', '{'):
+                depth += 1
+            elif c in (')', ']', '}'):
+                depth -= 1
+                if depth == 0:
+                    last = code[offset + start:offset + tokens[j][1]].strip()
+                    if last != '' or len(args) > 0:
+                        args.append(last)
+                    break
+            elif c == ',' and depth == 1:
+                args.append(code[offset + start:offset + tokens[j][1]].strip())
+                start = tokens[j][2]
+        return tuple(args)
+
+    idx = 0
+    while idx < len(tokens):
+        kind = tokens[idx][0]
+        t = text(idx)
+        pos = offset + tokens[idx][1]
+
+        if kind == 'punct':
+            if t == '(' or t == '[':
+                parens += 1
+            elif t == ')' or t == ']':
+                parens -= 1
+                while len(loops) > 0 and loops[-1][2] == 'paren' and loops[-1][4] > parens:
+                    loops.pop()
+                if t == ')' and len(headers) > 0 and headers[-1][2] == parens:
+                    loop_kind, line, _ = headers.pop()
+                    if text(idx + 1) == '{':
+                        body_loop = (loop_kind, line)
+                    else:
+                        loops.append((loop_kind, line, 'stmt', braces, parens))
+            elif t == ',':
+                if len(loops) > 0 and loops[-1][2] == 'paren' and loops[-1][4] == parens:
+                    loops.pop()
+            elif t == '{':
+                braces += 1
+                if body_loop is not None:
+                    loops.append((body_loop[0], body_loop[1], 'brace', braces, parens))
+                    body_loop = None
+            elif t == '}':
+                while len(loops) > 0 and loops[-1][2] != 'paren' and loops[-1][3] >= braces:
+                    loops.pop()
+                braces -= 1
+            elif t == ';':
+                while len(loops) > 0 and loops[-1][2] == 'stmt' and loops[-1][3] == braces and loops[-1][4] == parens:
+                    loops.pop()
+
+        elif kind == 'word':
+            if t in ('foreach', 'for', 'while') and text(idx + 1) == '(':
+                headers.append((t, structure.line_of(pos), parens))
+            elif t in _LOOP_CALLBACK_FUNCTIONS and text(idx + 1) == '(':
+                loops.append((t, structure.line_of(pos), 'paren', braces, parens + 1))
+                parens += 1
+                idx += 1
+            elif text(idx + 1) == ':' and text(idx + 2) == ':' and text(idx + 4) == '(' and tokens[idx + 3][0] == 'word':
+                name = text(idx + 3)
+                owner = class_file(t)
+                target = None if owner is None else CALLS.find_method(owner[0], owner[1], name)
+                if target is not None:
+                    calls.append(PHPCallSite('method', f"{t}::{name}", target, structure.line_of(pos), current_loops()))
+                idx += 3
+            elif t == 'new' and idx >= 2 and text(idx - 1) == '=' and tokens[idx - 2][0] == 'var' and tokens[idx + 1][0] == 'word':
+                types[text(idx - 2)] = text(idx + 1)
+
+        elif kind == 'var' and text(idx + 1) == '-' and text(idx + 2) == '>' and text(idx + 4) == '(' and tokens[idx + 3][0] == 'word':
+            name = text(idx + 3)
+            if t == '$DB':
+                if _DB_QUERY_METHOD.match(name):
+                    calls.append(PHPCallSite('db', f"$DB->{name}", None, structure.line_of(pos), current_loops(), arguments(idx + 4)))
+            else:
+                target = None
+                owner = class_file(types[t]) if t in types else None
+                if owner is not None:
+                    target = CALLS.find_method(owner[0], owner[1], name)
+                elif t not in types:
+                    candidates = CALLS.owners_of(name)
+                    if len(candidates) == 1:
+                        target = candidates[0][0], candidates[0][1], name
+                if target is not None:
+                    calls.append(PHPCallSite('method', f"{t}->{name}", target, structure.line_of(pos), current_loops()))
+            idx += 3
+
+        idx += 1
+
+    return calls
+
+def service_entry(info: FunctionInfo) -> tuple[str, str, str] | None:
+    """Returns the file, class and name of a service's main function, if it has one."""
+    for cls in SOURCES.structure(info.path, track=False).classes:
+        for method in cls.methods:
+            if method.is_public_static() and not method.name.endswith(("_parameters", "_returns")):
+                return info.path, cls.name, method.name
+    return None
+
+def find_query_loops(entry: tuple[str, str, str]) -> list[dict[str, Any]]:
+    """Finds every database query that runs once per iteration of a loop, following calls into the plugin's classes.
+
+    :param tuple entry: The file, class and name of the method to start at.
+    :returns: One entry per query and loop, with the file and line of both and the calls leading there.
+    """
+    findings: list[dict[str, Any]] = []
+    reported: set[tuple[str, int, str, int]] = set()
+    visited: set[tuple[tuple[str, str, str], tuple[str, str, int] | None]] = set()
+
+    def visit(target: tuple[str, str, str], outer: tuple[str, str, int] | None, via: list[str], active: frozenset):
+        if (target, outer) in visited:
+            return
+        visited.add((target, outer))
+        for call in CALLS.calls(*target):
+            loop = (target[0], *call.loops[-1]) if len(call.loops) > 0 else outer
+            if call.kind == 'db' or call.name in _QUERY_HELPERS:
+                if loop is None or (target[0], call.line, loop[0], loop[2]) in reported:
+                    continue
+                reported.add((target[0], call.line, loop[0], loop[2]))
+                findings.append({
+                    "call": call.name,
+                    "file": target[0],
+                    "line": call.line,
+                    "loop": {"kind": loop[1], "file": loop[0], "line": loop[2]},
+                    "via": via,
+                })
+            elif call.target is not None and call.target not in active:
+                visit(call.target, loop, via + [f"{call.name} ({target[0]}:{call.line})"], active | {call.target})
+
+    visit(entry, None, [], frozenset((entry,)))
+    return findings
+
+def write_query_audit(fp: str, infos: list[FunctionInfo]):
+    """Writes every query running once per loop iteration, per endpoint, as JSON. See :func:`find_query_loops`.
+
+    :param str fp: The file to write the report to, or '-' for stdout.
+    """
+    with timer("query_audit"):
+        endpoints = []
+        for info in infos:
+            entry = service_entry(info)
+            if entry is None:
+                continue
+            findings = find_query_loops(entry)
+            if len(findings) > 0:
+                endpoints.append({"endpoint": f"local_lbplanner_{info.group}_{info.name}", "queries_in_loops": findings})
+        endpoints.sort(key=lambda e: (-len(e["queries_in_loops"]), e["endpoint"]))
+        report = json.dumps({"endpoints": endpoints}, indent=2)
+    if fp == "-":
+        print(report)
+    else:
+        with open(fp, "w") as f:
+            f.write(report + "\n")
+
+class CallGraph:
+    """Static call graph from every service's main function through the plugin's helpers and models.
+
+    Nodes are methods, identified as ``class::method``, with the queries they make themselves.
+    Edges are calls, with the amount of loops around them.
+    """
+    __slots__ = ('endpoints', 'nodes', 'edges', 'files')
+    endpoints: dict[str, str]
+    nodes: dict[str, dict[str, Any]]
+    edges: dict[str, list[tuple[str, int, int]]]
+    files: set[str]
+
+    def __init__(self):
+        self.endpoints = {}
+        self.nodes = {}
+        self.edges = {}
+        self.files = set()
+
+    @staticmethod
+    def build(infos: list[FunctionInfo]) -> 'CallGraph':
+        """Scans every service and every method reachable from it."""
+        graph = CallGraph()
+        ids: dict[tuple[str, str, str], str] = {}
+
+        def node(target: tuple[str, str, str]) -> str:
+            node_id = ids.get(target)
+            if node_id is not None:
+                return node_id
+            node_id = f"{target[1]}::{target[2]}"
+            if node_id in graph.nodes:
+                node_id = f"{target[0]}:{node_id}" # two classes of the same name
+            ids[target] = node_id
+            graph.nodes[node_id] = {"file": target[0], "class": target[1], "method": target[2], "queries": []}
+            graph.edges[node_id] = []
+            graph.files.add(target[0])
+            pending.append(target)
+            return node_id
+
+        pending: list[tuple[str, str, str]] = []
+        for info in infos:
+            entry = service_entry(info)
+            if entry is not None:
+                graph.endpoints[f"local_lbplanner_{info.group}_{info.name}"] = node(entry)
+
+        while len(pending) > 0:
+            target = pending.pop()
+            node_id = ids[target]
+            for call in CALLS.calls(*target):
+                if call.kind == 'db':
+                    graph.nodes[node_id]["queries"].append({"call": call.name, "line": call.line, "loop_depth": len(call.loops)})
+                elif call.target is not None:
+                    graph.edges[node_id].append((node(call.target), call.line, len(call.loops)))
+        return graph
+
+    def round_trips(self, loop_weight: float) -> dict[str, float]:
+        """Estimates the database round trips of every node, counting everything inside a loop ``loop_weight`` times.
+
+        Mutually recursive methods (strongly connected components) are costed together, counting each of their queries
+        once, since there's no telling how deep the recursion goes. That way the estimate of a node doesn't depend on
+        the order the nodes are visited in.
+        """
+        # Tarjan's algorithm; components are completed callees first, so their costs can be summed up right away
+        index: dict[str, int] = {}
+        lowlink: dict[str, int] = {}
+        stack: list[str] = []
+        on_stack: set[str] = set()
+        costs: dict[str, float] = {}
+
+        def visit(node_id: str):
+            index[node_id] = lowlink[node_id] = len(index)
+            stack.append(node_id)
+            on_stack.add(node_id)
+            for callee, _, _ in self.edges[node_id]:
+                if callee not in index:
+                    visit(callee)
+                    lowlink[node_id] = min(lowlink[node_id], lowlink[callee])
+                elif callee in on_stack:
+                    lowlink[node_id] = min(lowlink[node_id], index[callee])
+            if lowlink[node_id] != index[node_id]:
+                return
+
+            component: list[str] = []
+            while True:
+                member = stack.pop()
+                on_stack.discard(member)
+                component.append(member)
+                if member == node_id:
+                    break
+            members = set(component)
+            total = 0.0
+            for member in component:
+                total += sum((loop_weight ** query["loop_depth"] for query in self.nodes[member]["queries"]), 0.0)
+                for callee, _, depth in self.edges[member]:
+                    if callee not in members:
+                        total += loop_weight ** depth * costs[callee]
+            for member in component:
+                costs[member] = total
+
+        for node_id in self.nodes.keys():
+            if node_id not in index:
+                visit(node_id)
+        return costs
+
+    def report(self, loop_weight: float) -> dict[str, Any]:
+        costs = self.round_trips(loop_weight)
+        endpoints = [
+            {"endpoint": name, "entry": node_id, "estimated_round_trips": costs[node_id]}
+            for name, node_id in self.endpoints.items()
+        ]
+        endpoints.sort(key=lambda e: (-e["estimated_round_trips"], e["endpoint"]))
+        return {
+            "loop_weight": loop_weight,
+            "endpoints": endpoints,
+            "nodes": {node_id: {**data, "estimated_round_trips": costs[node_id]} for node_id, data in self.nodes.items()},
+            "edges": [
+                {"from": caller, "to": callee, "line": line, "loop_depth": depth}
+                for caller, calls in self.edges.items()
+                for callee, line, depth in calls
+            ],
+        }
+
+    def dot(self, loop_weight: float) -> str:
+        """Renders the graph for graphviz, with calls inside loops drawn bold."""
+        costs = self.round_trips(loop_weight)
+        lines = ["digraph calls {", "    rankdir=LR;", "    node [shape=box, fontname=monospace];"]
+        for name, node_id in sorted(self.endpoints.items()):
+            lines.append(f"    {json.dumps(name)} [shape=oval, label={json.dumps(f'{name}\n~{costs[node_id]:g} round trips')}];")
+            lines.append(f"    {json.dumps(name)} -> {json.dumps(node_id)};")
+        for node_id, data in self.nodes.items():
+            lines.append(f"    {json.dumps(node_id)} [label={json.dumps(f'{node_id}\n{len(data['queries'])} queries')}];")
+        for caller, calls in self.edges.items():
+            for callee, line, depth in calls:
+                style = f", style=bold, label=\"loop×{depth}\"" if depth > 0 else ""
+                lines.append(f"    {json.dumps(caller)} -> {json.dumps(callee)} [tooltip=\"line {line}\"{style}];")
+        lines.append("}")
+        return "\n".join(lines) + "\n"
+
+class CallGraphCache:
+    """On-disk copy of the call graph, valid as long as the tool and every scanned file are unchanged."""
+    __slots__ = ('fp', 'version')
+    fp: str
+    version: str
+
+    def __init__(self, root: str):
+        self.fp = path.join(root, "callgraph.pickle")
+        with open(__file__, "rb") as f:
+            self.version = hashlib.sha256(f.read()).hexdigest()
+
+    def load(self, infos: list[FunctionInfo]) -> CallGraph | None:
+        try:
+            with open(self.fp, "rb") as f:
+                version, services, digests, graph = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, AttributeError):
+            return None
+        if version != self.version or services != [info.path for info in infos]:
+            return None
+        if any(SOURCES.digest(fp) != digest for fp, digest in digests.items()):
+            return None
+        # a new class file may be what an unresolved call refers to
+        if sorted(SYMBOLS.load().values()) != sorted(fp for fp in digests.keys() if fp.startswith(SYMBOLS.root)):
+            return None
+        return graph
+
+    def store(self, infos: list[FunctionInfo], graph: CallGraph):
+        files = graph.files | set(SYMBOLS.load().values())
+        digests = {fp: SOURCES.digest(fp) for fp in files}
+        makedirs(path.dirname(self.fp), exist_ok=True)
+        with open(self.fp + ".tmp", "wb") as f:
+            pickle.dump((self.version, [info.path for info in infos], digests, graph), f, pickle.HIGHEST_PROTOCOL)
+        replace(self.fp + ".tmp", self.fp)
+
+def write_call_graph(infos: list[FunctionInfo], cachedir: str | None, loop_weight: float, fp: str | None, dot_fp: str | None):
+    """Builds (or loads) the call graph and writes it as JSON and/or DOT.
+
+    :param str | None cachedir: The cache directory to keep the graph in, if any.
+    :param float loop_weight: How many times to count everything inside a loop.
+    :param str | None fp: The file to write the JSON to, '-' for stdout, or None for no JSON.
+    :param str | None dot_fp: The file to write the DOT to, '-' for stdout, or None for no DOT.
+    """
+    with timer("call_graph"):
+        cache = None if cachedir is None else CallGraphCache(cachedir)
+        graph = None if cache is None else cache.load(infos)
+        if graph is None:
+            graph = CallGraph.build(infos)
+            if cache is not None:
+                cache.store(infos, graph)
+
+    for out, render in ((fp, lambda: json.dumps(graph.report(loop_weight), indent=2) + "\n"), (dot_fp, lambda: graph.dot(loop_weight))):
+        if out is None:
+            continue
+        if out == "-":
+            sys.stdout.write(render())
+        else:
+            with open(out, "w") as f:
+                f.write(render())
+
+class DBTable:
+    """A table declared in install.xml, with every set of columns the database keeps an index for."""
+    __slots__ = ('name', 'fields', 'indexes')
+    name: str
+    fields: list[str]
+    indexes: list[tuple[str, str, tuple[str, ...]]]
+
+    def __init__(self, name: str):
+        self.name = name
+        self.fields = []
+        # (name, type, columns); moodle creates an index for every key, foreign ones included
+        self.indexes = []
+
+    def is_indexed(self, columns: Iterable[str]) -> bool:
+        """Whether looking up rows by these columns can use an index, i.e. some index starts with one of them."""
+        columns = set(columns)
+        return any(index[2][0] in columns for index in self.indexes)
+
+    def unknown_columns(self, columns: Iterable[str]) -> list[str]:
+        """Returns the columns that aren't declared as fields of the table, in the order given."""
+        fields = set(self.fields)
+        return [column for column in columns if column not in fields]
+
+def parse_install_xml(fp: str) -> dict[str, DBTable]:
+    """Reads the tables, keys and indexes declared in an install.xml."""
+    tables = {}
+    root = ET.fromstring(SOURCES.read(fp, track=False))
+    for table_el in root.iter("TABLE"):
+        table = DBTable(table_el.get("NAME", ""))
+        for field in table_el.iter("FIELD"):
+            table.fields.append(field.get("NAME", ""))
+        for key in [*table_el.iter("KEY"), *table_el.iter("INDEX")]:
+            kind = key.get("TYPE") or ("unique index" if key.get("UNIQUE") == "true" else "index")
+            columns = tuple(column.strip() for column in key.get("FIELDS", "").split(","))
+            table.indexes.append((key.get("NAME", ""), kind, columns))
+        tables[table.name] = table
+    return tables
+
+# the position of the conditions array of every $DB method that takes one
+_CONDITIONS_ARGUMENT = {
+    "get_record": 1, "get_records": 1, "get_records_menu": 1, "get_recordset": 1, "record_exists": 1,
+    "count_records": 1, "delete_records": 1, "get_field": 2, "get_fieldset": 2, "set_field": 3,
+}
+# the position of the column name of every $DB method that looks rows up by a list of values
+_LIST_FIELD_ARGUMENT = {"get_records_list": 1, "get_recordset_list": 1, "delete_records_list": 1}
+# methods that read (or delete) a whole table if they don't get any conditions
+_FULL_TABLE_METHODS = frozenset(("get_records", "get_records_menu", "get_recordset", "get_fieldset", "count_records", "delete_records"))
+_SQL_METHODS = frozenset(("get_records_sql", "get_record_sql", "get_fieldset_sql", "count_records_sql", "get_recordset_sql", "execute"))
+
+class QueryResolver:
+    """Turns the arguments of $DB calls into table names, columns and SQL, resolving class constants of the plugin."""
+    __slots__ = ('constants',)
+    constants: dict[str, dict[str, str]]
+
+    def __init__(self):
+        self.constants = {}
+
+    def constant(self, fp: str, classname: str, name: str) -> str | None:
+        class_fp: str | None
+        structure = SOURCES.structure(fp, track=False)
+        if classname in ('self', 'static'):
+            class_fp = fp
+        else:
+            class_fp = resolve_class(structure.name_resolution(), classname)
+        if class_fp is None:
+            return None
+        values = self.constants.get(class_fp)
+        if values is None:
+            pattern = r"const (\w+) = (['\"])(.*?)\2;"
+            values = {m[0]: m[2] for m in re.findall(pattern, SOURCES.read(class_fp, track=False))}
+            self.constants[class_fp] = values
+        return values.get(name)
+
+    def string(self, fp: str, expr: str) -> str | None:
+        """Evaluates string literals, class constants and concatenations of them. Anything else becomes ``?``.
+
+        :returns: The string, or None if the expression isn't even partially made of strings.
+        """
+        parts = []
+        known = False
+        for m in re.finditer(r"'((?:[^'\\]|\\.)*)'|\"((?:[^\"\\]|\\.)*)\"|(\w+)::(\w+)|(\.)|(\S+?)(?=\s*(?:\.|$))", expr, re.DOTALL):
+            if m.group(1) is not None or m.group(2) is not None:
+                parts.append(m.group(1) if m.group(1) is not None else m.group(2))
+                known = True
+            elif m.group(3) is not None:
+                value = self.constant(fp, m.group(3), m.group(4))
+                parts.append("?" if value is None else value)
+                known = known or value is not None
+            elif m.group(6) is not None:
+                parts.append("?")
+        return "".join(parts) if known else None
+
+    @staticmethod
+    def condition_columns(expr: str | None) -> list[str] | None:
+        """Returns the keys of a literal conditions array, [] for no conditions, or None if they aren't known."""
+        if expr is None or expr == 'null':
+            return []
+        if not (expr.startswith('[') and expr.endswith(']')) and not expr.startswith('array('):
+            return None
+        return re.findall(r"['\"](\w+)['\"]\s*=>", expr)
+
+_SQL_TABLE = re.compile(r"\{(\w+)\}(?:\s+(?:as\s+)?(?!(?:inner|left|right|join|on|where|cross)\b)(\w+))?", re.IGNORECASE)
+_SQL_CLAUSES = re.compile(r"\b(?:on|where)\b(.*?)(?=\b(?:inner|left|right|join|group|order|limit|having)\b|$)", re.IGNORECASE | re.DOTALL)
+
+def sql_lookups(sql: str) -> dict[str, set[str]]:
+    """Returns the columns every table of a query is filtered or joined by, going by its ON and WHERE clauses."""
+    aliases: dict[str, str] = {}
+    columns: dict[str, set[str]] = {}
+    for table, alias in _SQL_TABLE.findall(sql):
+        aliases[alias or table] = table
+        columns.setdefault(table, set())
+
+    for clause in _SQL_CLAUSES.findall(sql):
+        for alias, column in re.findall(r"\b(\w+)\.(\w+)\b", clause):
+            if alias in aliases:
+                columns[aliases[alias]].add(column)
+        if len(columns) == 1:
+            table = next(iter(columns.keys()))
+            for column in re.findall(r"(?<![.\w])(\w+)\s*(?:=|<>|!=|<=|>=|<|>|\bIN\b|\bLIKE\b|\bIS\b)", clause, re.IGNORECASE):
+                columns[table].add(column)
+    return columns
+
+def audit_indexes(infos: list[FunctionInfo], schema: dict[str, DBTable], graph: CallGraph) -> dict[str, Any]:
+    """Checks every query reachable from a service against the indexes in the schema.
+
+    :param list[FunctionInfo] infos: The services to check.
+    :param dict[str, DBTable] schema: The plugin's tables, see :func:`parse_install_xml`.
+    :param CallGraph graph: The call graph of the services, to find out which endpoints reach which query.
+    :returns: Lookups without a fitting index, lookups by columns the table doesn't have, and reads of whole tables,
+        each with the endpoints reaching them.
+    """
+    callers: dict[str, set[str]] = {}
+    for caller, calls in graph.edges.items():
+        for callee, _, _ in calls:
+            callers.setdefault(callee, set()).add(caller)
+    entries: dict[str, set[str]] = {}
+    for endpoint, node_id in graph.endpoints.items():
+        entries.setdefault(node_id, set()).add(endpoint)
+
+    reaching_cache: dict[str, list[str]] = {}
+
+    def reaching(node_id: str) -> list[str]:
+        result = reaching_cache.get(node_id)
+        if result is None:
+            found: set[str] = set()
+            seen = {node_id}
+            pending = [node_id]
+            while len(pending) > 0:
+                current = pending.pop()
+                found |= entries.get(current, set())
+                for caller in callers.get(current, ()):
+                    if caller not in seen:
+                        seen.add(caller)
+                        pending.append(caller)
+            result = reaching_cache[node_id] = sorted(found)
+        return result
+
+    resolver = QueryResolver()
+    unindexed: list[dict[str, Any]] = []
+    unknown: list[dict[str, Any]] = []
+    full_reads: list[dict[str, Any]] = []
+    unresolved = 0
+
+    # every method of the plugin gets checked, even those no endpoint reaches (yet)
+    node_ids = {(node["file"], node["class"], node["method"]): node_id for node_id, node in graph.nodes.items()}
+    methods = []
+    for fp in sorted({*SYMBOLS.load().values(), *(info.path for info in infos)}):
+        for cls in SOURCES.structure(fp, track=False).classes:
+            for method in cls.methods:
+                methods.append((fp, cls.name, method.name))
+
+    for fp, classname, methodname in methods:
+        node_id = node_ids.get((fp, classname, methodname))
+        for call in CALLS.calls(fp, classname, methodname):
+            if call.kind != 'db':
+                continue
+            method = call.name.removeprefix("$DB->")
+            site = {"call": call.name, "file": fp, "line": call.line}
+
+            lookups: dict[str, list[str] | None] = {}
+            if method in _SQL_METHODS or method.endswith("_select"):
+                position = 0 if method in _SQL_METHODS else 1
+                sql = resolver.string(fp, call.args[position]) if len(call.args) > position else None
+                if sql is None:
+                    unresolved += 1
+                    continue
+                if position == 1:
+                    # *_select methods only get the WHERE clause
+                    table = resolver.string(fp, call.args[0])
+                    sql = f"SELECT * FROM {{{table}}}" + (f" WHERE {sql}" if sql.strip() != "" else "")
+                for table, columns in sql_lookups(sql).items():
+                    lookups[table] = sorted(columns)
+            elif method in _CONDITIONS_ARGUMENT or method in _LIST_FIELD_ARGUMENT:
+                table = resolver.string(fp, call.args[0]) if len(call.args) > 0 else None
+                if table is None:
+                    unresolved += 1
+                    continue
+                if method in _LIST_FIELD_ARGUMENT:
+                    position = _LIST_FIELD_ARGUMENT[method]
+                    column = resolver.string(fp, call.args[position]) if len(call.args) > position else None
+                    lookups[table] = None if column is None else [column]
+                else:
+                    position = _CONDITIONS_ARGUMENT[method]
+                    lookups[table] = QueryResolver.condition_columns(call.args[position] if len(call.args) > position else None)
+            else:
+                continue # inserts and updates by id
+
+            for table, columns in lookups.items():
+                if columns is None:
+                    unresolved += 1
+                elif len(columns) == 0:
+                    if method in _FULL_TABLE_METHODS or method in _SQL_METHODS:
+                        full_reads.append({"table": table, **site, "endpoints": [] if node_id is None else reaching(node_id)})
+                elif table in schema:
+                    missing = schema[table].unknown_columns(columns)
+                    if len(missing) > 0:
+                        unknown.append({"table": table, "columns": missing, **site, "endpoints": [] if node_id is None else reaching(node_id)})
+                    elif not schema[table].is_indexed(columns):
+                        unindexed.append({"table": table, "columns": columns, **site, "endpoints": [] if node_id is None else reaching(node_id)})
+
+    def order(entry: dict[str, Any]) -> tuple:
+        return -len(entry["endpoints"]), entry["file"], entry["line"]
+
+    return {
+        "tables": {
+            name: {"fields": table.fields, "indexes": [{"name": n, "type": t, "fields": list(c)} for n, t, c in table.indexes]}
+            for name, table in schema.items()
+        },
+        "unindexed_lookups": sorted(unindexed, key=order),
+        "unknown_columns": sorted(unknown, key=order),
+        "full_table_reads": sorted(full_reads, key=order),
+        "unresolved_queries": unresolved,
+    }
+
+def write_index_audit(fp: str, infos: list[FunctionInfo], cachedir: str | None):
+    """Writes the index coverage of every query as JSON. See :func:`audit_indexes`.
+
+    :param str fp: The file to write the report to, or '-' for stdout.
+    :param str | None cachedir: The cache directory the call graph is kept in, if any.
+    """
+    with timer("index_audit"):
+        cache = None if cachedir is None else CallGraphCache(cachedir)
+        graph = None if cache is None else cache.load(infos)
+        if graph is None:
+            graph = CallGraph.build(infos)
+            if cache is not None:
+                cache.store(infos, graph)
+        report = json.dumps(audit_indexes(infos, parse_install_xml("lbplanner/db/install.xml"), graph), indent=2)
+    if fp == "-":
+        print(report)
+    else:
+        with open(fp, "w") as f:
+            f.write(report + "\n")
+
+Validator = Callable[[Any], bool]
+
+_TYPE_VALIDATORS: dict[str, Validator] = {
+    "int": lambda v: type(v) is int,
+    "String": lambda v: type(v) is str,
+    # moodle accepts 0 and 1 for PARAM_BOOL
+    "bool": lambda v: type(v) is bool or (type(v) is int and (v == 0 or v == 1)),
+}
+
+def compile_validator(element: IRElement | None) -> Validator:
+    """Turns an IR tree into a closure that checks whether a decoded JSON value conforms to it.
+
+    All decisions that only depend on the IR (field lists, type checks, nullability) are made here, once,
+    so checking a value doesn't look at the IR at all. Use :func:`explain_violations` to find out why
+    a value doesn't conform.
+
+    :param IRElement | None element: The IR to compile, or None for "no value".
+    """
+    if element is None:
+        return lambda v: v is None or v == [] or v == {}
+
+    if isinstance(element, IRObject):
+        fields = tuple((name, compile_validator(field), field.required) for name, field in element.fields.items())
+        names = frozenset(element.fields.keys())
+
+        def check_object(v: Any) -> bool:
+            if type(v) is not dict or not names.issuperset(v.keys()):
+                return False
+            for name, check, required in fields:
+                if name in v:
+                    if not check(v[name]):
+                        return False
+                elif required:
+                    return False
+            return True
+        return check_object
+
+    if isinstance(element, IRArray):
+        check_item = compile_validator(element.value)
+
+        def check_array(v: Any) -> bool:
+            if type(v) is not list:
+                return False
+            for item in v:
+                if not check_item(item):
+                    return False
+            return True
+        return check_array
+
+    assert isinstance(element, IRValue)
+    check_type = _TYPE_VALIDATORS.get(element.type)
+    if check_type is None:
+        # an undocumented type, e.g. PARAM_FLOAT, accept anything
+        return lambda v: True
+    if element.nullable:
+        return lambda v: v is None or check_type(v)
+    return check_type
+
+def explain_violations(element: IRElement | None, value: Any, where: str, out: list[str]):
+    """Lists every way a value doesn't conform to an IR tree. Slow, only meant for values that failed validation.
+
+    :param IRElement | None element: The IR to check against.
+    :param Any value: The decoded JSON value.
+    :param str where: The path of the value, e.g. ``response[3].id``.
+    :param list[str] out: Gets the violations appended.
+    """
+    if element is None:
+        if not (value is None or value == [] or value == {}):
+            out.append(f"{where}: expected nothing, got {type(value).__name__}")
+    elif isinstance(element, IRObject):
+        if type(value) is not dict:
+            out.append(f"{where}: expected object, got {type(value).__name__}")
+            return
+        for name in value.keys():
+            if name not in element.fields:
+                out.append(f"{where}.{name}: unexpected field")
+        for name, field in element.fields.items():
+            if name in value:
+                explain_violations(field, value[name], f"{where}.{name}", out)
+            elif field.required:
+                out.append(f"{where}.{name}: missing required field")
+    elif isinstance(element, IRArray):
+        if type(value) is not list:
+            out.append(f"{where}: expected array, got {type(value).__name__}")
+            return
+        for idx, item in enumerate(value):
+            explain_violations(element.value, item, f"{where}[{idx}]", out)
+    else:
+        assert isinstance(element, IRValue)
+        if value is None:
+            if not element.nullable:
+                out.append(f"{where}: null is not allowed")
+        elif not compile_validator(element)(value):
+            out.append(f"{where}: expected {element.type}, got {type(value).__name__}")
+
+VALIDATORS: dict[str, tuple[FunctionInfoEx, Validator, Validator]] = {}
+
+def load_validators(complete_info: list[FunctionInfoEx]):
+    """Compiles the parameter and response validators of every service, keyed by web service function name."""
+    VALIDATORS.clear()
+    for info in complete_info:
+        VALIDATORS[f"local_lbplanner_{info.group}_{info.name}"] = (
+            info,
+            compile_validator(info.parameters),
+            compile_validator(info.returns),
+        )
+
+class ValidationStats:
+    """Per-endpoint results of validating payloads, mergeable across chunks and processes."""
+    __slots__ = ('records', 'malformed', 'unknown', 'endpoints')
+    records: int
+    malformed: int
+    unknown: dict[str, int]
+    endpoints: dict[str, list[Any]]
+
+    MAX_EXAMPLES = 5
+
+    def __init__(self):
+        self.records = 0
+        self.malformed = 0
+        self.unknown = {}
+        # wsfunction → [records, parameter violations, response violations, examples]
+        self.endpoints = {}
+
+    def merge(self, other: 'ValidationStats'):
+        self.records += other.records
+        self.malformed += other.malformed
+        for name, count in other.unknown.items():
+            self.unknown[name] = self.unknown.get(name, 0) + count
+        for name, (records, params, responses, examples) in other.endpoints.items():
+            entry = self.endpoints.setdefault(name, [0, 0, 0, []])
+            entry[0] += records
+            entry[1] += params
+            entry[2] += responses
+            entry[3].extend(examples[:self.MAX_EXAMPLES - len(entry[3])])
+
+def validate_payloads(lines: list[str]) -> ValidationStats:
+    """Validates JSONL records of the form ``{"wsfunction": ..., "params": ..., "response": ...}``.
+
+    Expects :func:`load_validators` to have been called in this process.
+    """
+    stats = ValidationStats()
+    for line in lines:
+        if line.strip() == "":
+            continue
+        stats.records += 1
+        try:
+            record = json.loads(line)
+            name = record["wsfunction"]
+            if not isinstance(name, str):
+                raise TypeError(f"wsfunction must be a string, not {type(name).__name__}")
+        except (ValueError, TypeError, KeyError):
+            stats.malformed += 1
+            continue
+
+        validators = VALIDATORS.get(name)
+        if validators is None:
+            stats.unknown[name] = stats.unknown.get(name, 0) + 1
+            continue
+        info, check_params, check_response = validators
+
+        entry = stats.endpoints.get(name)
+        if entry is None:
+            entry = stats.endpoints[name] = [0, 0, 0, []]
+        entry[0] += 1
+
+        params_ok = check_params(record.get("params"))
+        response_ok = check_response(record.get("response"))
+        if params_ok and response_ok:
+            continue
+
+        violations: list[str] = []
+        if not params_ok:
+            entry[1] += 1
+            explain_violations(info.parameters, record.get("params"), "params", violations)
+        if not response_ok:
+            entry[2] += 1
+            explain_violations(info.returns, record.get("response"), "response", violations)
+        if len(entry[3]) < ValidationStats.MAX_EXAMPLES:
+            entry[3].append(violations)
+    return stats
+
+def read_chunks(fp: str, size: int) -> Iterable[list[str]]:
+    """Yields the lines of a file in lists of at most ``size``, reading stdin for '-'."""
+    f = sys.stdin if fp == "-" else open(fp, "r")
+    try:
+        chunk = []
+        for line in f:
+            chunk.append(line)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if len(chunk) > 0:
+            yield chunk
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def run_validation(fp: str, complete_info: list[FunctionInfoEx], jobs: int, out: str, chunksize: int = 2000):
+    """Streams a JSONL file of recorded web service calls through the compiled validators and reports the results.
+
+    At most two chunks per worker are in flight at any time, so memory stays bounded no matter how big the file is.
+
+    :param str fp: The JSONL file, or '-' for stdin.
+    :param list[FunctionInfoEx] complete_info: The services to validate against.
+    :param int jobs: The maximum amount of worker processes to use.
+    :param str out: The file to write the JSON report to, or '-' for stdout.
+    :param int chunksize: The amount of lines sent to a worker at once.
+    """
+    start = perf_counter()
+    stats = ValidationStats()
+    if jobs <= 1:
+        load_validators(complete_info)
+        for chunk in read_chunks(fp, chunksize):
+            stats.merge(validate_payloads(chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=load_validators, initargs=(complete_info,)) as executor:
+            in_flight: set[Future[ValidationStats]] = set()
+            for chunk in read_chunks(fp, chunksize):
+                if len(in_flight) >= jobs * 2:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stats.merge(future.result())
+                in_flight.add(executor.submit(validate_payloads, chunk))
+            for future in in_flight:
+                stats.merge(future.result())
+    seconds = perf_counter() - start
+
+    report = {
+        "records": stats.records,
+        "seconds": seconds,
+        "records_per_second": stats.records / seconds if seconds > 0 else None,
+        "malformed": stats.malformed,
+        "unknown_endpoints": stats.unknown,
+        "endpoints": {
+            name: {
+                "records": records,
+                "parameter_violations": params,
+                "response_violations": responses,
+                "examples": examples,
+            }
+            for name, (records, params, responses, examples) in sorted(stats.endpoints.items())
+        },
+    }
+    text = json.dumps(report, indent=2)
+    if out == "-":
+        print(text)
+    else:
+        with open(out, "w") as f:
+            f.write(text + "\n")
+
+def report_warnings(servicecount: int, fp: str | None) -> bool:
+    """Reports all diagnostics emitted so far, in the configured format.
+
+    :param int servicecount: The amount of services that were checked.
+    :param str | None fp: The file to write machine-readable diagnostics to, or None for stderr.
+    :returns: Whether any diagnostic code exceeded its budget.
+    """
+    failed = DIAGNOSTICS.summary(servicecount)
+    if DIAGNOSTICS.format != "terminal":
+        report = json.dumps(DIAGNOSTICS.report(), indent=2)
+        if fp is None:
+            print(report, file=sys.stderr)
+        else:
+            with open(fp, "w") as f:
+                f.write(report)
+    return failed
+
 
 if __name__ == "__main__":
     main()
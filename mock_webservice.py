@@ -0,0 +1,313 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import sys
+from array import array
+from collections import OrderedDict
+from time import perf_counter
+from typing import Any
+from urllib.parse import parse_qsl, urlsplit
+
+import document_services as ds
+
+SERVER_PATH = "/webservice/rest/server.php"
+STATS_PATH = "/mock/stats"
+
+# request bodies above this size get rejected instead of buffered
+MAX_BODY_SIZE = 1 << 20
+
+# moodle's own request parameters, which don't select a different response
+IGNORED_PARAMS = frozenset(("wstoken", "wsfunction", "moodlewsrestformat"))
+
+def load_services(jobs: int) -> list[ds.FunctionInfoEx]:
+    """Extracts all services from the plugin in the working directory, the same way document_services.py does."""
+    def extract() -> list[ds.FunctionInfoEx]:
+        infos = ds.extract_function_info(ds.SOURCES.read("lbplanner/db/services.php"))
+        return ds.process_services(infos, jobs)
+
+    complete_info, diagnostics, _ = ds.run_captured(extract)
+    if len(diagnostics) > 0:
+        print(f"ignored {len(diagnostics)} warnings while extracting the services", file=sys.stderr)
+    return complete_info
+
+def synthesize(element: ds.IRElement | None, rng: random.Random, name: str, array_items: int) -> Any:
+    """Generates a value conforming to an IR tree.
+
+    :param IRElement | None element: The IR to generate a value for.
+    :param random.Random rng: The source of randomness; the same state always yields the same value.
+    :param str name: The name of the field, used for readable strings.
+    :param int array_items: The maximum amount of items per array.
+    """
+    if element is None:
+        return None
+    elif isinstance(element, ds.IRObject):
+        out = {}
+        for fieldname, field in element.fields.items():
+            if not field.required and rng.random() < 0.25:
+                continue # optional fields are sometimes left out, just like moodle would
+            out[fieldname] = synthesize(field, rng, fieldname, array_items)
+        return out
+    elif isinstance(element, ds.IRArray):
+        return [synthesize(element.value, rng, name, array_items) for _ in range(rng.randint(0, array_items))]
+
+    assert isinstance(element, ds.IRValue)
+    if element.nullable and rng.random() < 0.1:
+        return None
+    if element.default_value is not None and rng.random() < 0.5:
+        return element.default_value
+    match element.type:
+        case "int":
+            return rng.randint(1, 100000)
+        case "bool":
+            return rng.random() < 0.5
+        case "String":
+            return f"{name}-{rng.randint(0, 9999)}"
+        case _:
+            return None
+
+class LatencyStats:
+    """Request counts and latencies, overall and per endpoint.
+
+    Only the most recent latencies are kept for the percentiles, so memory stays constant under load.
+    """
+    __slots__ = ('started', 'recent', 'position', 'requests', 'endpoints', 'hits', 'misses')
+    started: float
+    recent: array
+    position: int
+    requests: int
+    endpoints: dict[str, list[float]]
+    hits: int
+    misses: int
+
+    WINDOW = 65536
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.recent = array('d')
+        self.position = 0
+        self.requests = 0
+        # endpoint → [requests, total seconds, max seconds]
+        self.endpoints = {}
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, endpoint: str, seconds: float):
+        self.requests += 1
+        if len(self.recent) < self.WINDOW:
+            self.recent.append(seconds)
+        else:
+            self.recent[self.position] = seconds
+            self.position = (self.position + 1) % self.WINDOW
+
+        entry = self.endpoints.get(endpoint)
+        if entry is None:
+            entry = self.endpoints[endpoint] = [0, 0.0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+        if seconds > entry[2]:
+            entry[2] = seconds
+
+    def report(self) -> dict[str, Any]:
+        uptime = perf_counter() - self.started
+        latencies = sorted(self.recent)
+
+        def percentile(p: float) -> float | None:
+            if len(latencies) == 0:
+                return None
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1e6
+
+        return {
+            "uptime_seconds": uptime,
+            "requests": self.requests,
+            "requests_per_second": self.requests / uptime if uptime > 0 else None,
+            "cache": {"hits": self.hits, "misses": self.misses},
+            "latency_us": {
+                "window": len(latencies),
+                "p50": percentile(0.5),
+                "p90": percentile(0.9),
+                "p99": percentile(0.99),
+                "max": latencies[-1] * 1e6 if len(latencies) > 0 else None,
+            },
+            "endpoints": {
+                name: {"requests": count, "mean_us": total / count * 1e6, "max_us": peak * 1e6}
+                for name, (count, total, peak) in sorted(self.endpoints.items())
+            },
+        }
+
+def http_response(status: str, body: bytes, keep_alive: bool) -> bytes:
+    return (
+        f"HTTP/1.1 {status}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        "\r\n"
+    ).encode('ascii') + body
+
+class MockWebService:
+    """Answers moodle web service calls with data synthesized from the extracted IR.
+
+    Responses are seeded by the function name and the parameters, so the same call always gets the same answer.
+    Encoded responses are kept in an LRU cache, and calls without parameters are generated ahead of time.
+    """
+    __slots__ = ('services', 'seed', 'array_items', 'cache', 'cache_size', 'stats')
+    services: dict[str, ds.FunctionInfoEx]
+    seed: int
+    array_items: int
+    cache: OrderedDict[tuple[str, str], bytes]
+    cache_size: int
+    stats: LatencyStats
+
+    def __init__(self, complete_info: list[ds.FunctionInfoEx], seed: int, array_items: int, cache_size: int):
+        self.services = {f"local_lbplanner_{info.group}_{info.name}": info for info in complete_info}
+        self.seed = seed
+        self.array_items = array_items
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.stats = LatencyStats()
+
+        for wsfunction in self.services.keys():
+            self.body(wsfunction, "")
+        self.stats.misses = 0
+
+    def body(self, wsfunction: str, paramkey: str) -> bytes:
+        """Returns the encoded response of a call, generating it if it isn't cached.
+
+        :param str wsfunction: The name of the web service function.
+        :param str paramkey: The canonical form of the call's parameters.
+        """
+        key = (wsfunction, paramkey)
+        body = self.cache.get(key)
+        if body is not None:
+            self.stats.hits += 1
+            self.cache.move_to_end(key)
+            return body
+
+        self.stats.misses += 1
+        info = self.services.get(wsfunction)
+        if info is None:
+            body = json.dumps({
+                "exception": "dml_missing_record_exception",
+                "errorcode": "invalidrecord",
+                "message": f"Can't find data record in database table external_functions. ({wsfunction})",
+            }).encode('utf-8')
+        else:
+            digest = hashlib.blake2b(f"{self.seed}\0{wsfunction}\0{paramkey}".encode('utf-8'), digest_size=8).digest()
+            rng = random.Random(int.from_bytes(digest))
+            body = json.dumps(synthesize(info.returns, rng, info.name, self.array_items)).encode('utf-8')
+
+        self.cache[key] = body
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return body
+
+    def handle(self, target: str, form: bytes) -> tuple[str, bytes, str]:
+        """Answers a single request.
+
+        :param str target: The request target, e.g. ``/webservice/rest/server.php?wsfunction=...``.
+        :param bytes form: The url-encoded request body, if any.
+        :returns: The HTTP status, the body, and the endpoint to attribute the request to.
+        """
+        url = urlsplit(target)
+        if url.path == STATS_PATH:
+            return "200 OK", json.dumps(self.stats.report(), indent=2).encode('utf-8'), STATS_PATH
+        if url.path != SERVER_PATH:
+            return "404 Not Found", b'{"error": "not found"}', url.path
+
+        params = parse_qsl(url.query, keep_blank_values=True)
+        if len(form) > 0:
+            # undecodable bytes get replaced, just like parse_qsl does for undecodable percent-escapes
+            params += parse_qsl(form.decode('utf-8', errors='replace'), keep_blank_values=True)
+        wsfunction = ""
+        rest = []
+        for k, v in params:
+            if k == "wsfunction":
+                wsfunction = v
+            elif k not in IGNORED_PARAMS:
+                rest.append((k, v))
+        rest.sort()
+        paramkey = "&".join(f"{k}={v}" for k, v in rest)
+        return "200 OK", self.body(wsfunction, paramkey), wsfunction
+
+    async def serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serves requests on a connection until the client closes it, supporting keep-alive."""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                start = perf_counter()
+
+                lines = head.decode('latin-1').split("\r\n")
+                parts = lines[0].split(" ")
+                if len(parts) != 3:
+                    writer.write(http_response("400 Bad Request", b'{"error": "bad request"}', False))
+                    break
+                method, target, version = parts
+
+                length = 0
+                keep_alive = version == "HTTP/1.1"
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    name = name.strip().lower()
+                    if name == "content-length":
+                        try:
+                            length = int(value)
+                        except ValueError:
+                            length = -1
+                    elif name == "connection":
+                        keep_alive = value.strip().lower() == "keep-alive"
+                if length < 0:
+                    # without a valid length, the end of the body and thus the next request can't be found
+                    writer.write(http_response("400 Bad Request", b'{"error": "invalid content-length"}', False))
+                    break
+                if length > MAX_BODY_SIZE:
+                    writer.write(http_response("413 Content Too Large", b'{"error": "request body too large"}', False))
+                    break
+                # the body has to be consumed whatever the method, or it would be read as the next request
+                try:
+                    body = await reader.readexactly(length) if length > 0 else b""
+                except asyncio.IncompleteReadError:
+                    break
+                form = body if method == "POST" else b""
+
+                status, body, endpoint = self.handle(target, form)
+                writer.write(http_response(status, body, keep_alive))
+                self.stats.record(endpoint, perf_counter() - start)
+                if not keep_alive:
+                    break
+                if writer.transport.get_write_buffer_size() > 1 << 16:
+                    await writer.drain()
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+async def serve(service: MockWebService, host: str, port: int):
+    server = await asyncio.start_server(service.serve_connection, host, port)
+    addresses = ", ".join(f"http://{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in server.sockets)
+    print(f"serving {len(service.services)} web service functions on {addresses}{SERVER_PATH}, stats at {STATS_PATH}", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serves synthesized responses for all web services of the plugin, for load-testing clients.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthesized responses (default: %(default)s)")
+    parser.add_argument("--array-items", type=int, default=5, help="maximum amount of items per array (default: %(default)s)")
+    parser.add_argument("--cache-size", type=int, default=100000, help="amount of responses to keep cached (default: %(default)s)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="amount of worker processes to extract services with")
+    args = parser.parse_args()
+
+    service = MockWebService(load_services(args.jobs), args.seed, args.array_items, args.cache_size)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()